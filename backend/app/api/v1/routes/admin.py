@@ -0,0 +1,67 @@
+import io
+import secrets
+from typing import Literal
+
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.recent_messages import recent_messages
+from app.db.compression import payload_codec
+from app.services.importer import import_dump
+
+router = APIRouter()
+
+
+async def require_admin(x_admin_token: str | None = Header(None)):
+    expected = settings.admin_token
+    if expected is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token, expected.get_secret_value()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.post("/import", dependencies=[Depends(require_admin)])
+async def import_history(
+    source: str = Form(..., min_length=1, max_length=255),
+    format: Literal["jsonl", "csv"] = Form("jsonl"),
+    chunk_size: int | None = Form(None, ge=1, le=100_000),
+    file: UploadFile = File(...),
+):
+    # The upload is already spooled to disk; it is read a line at a time.
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        report = await import_dump(stream, format, source, chunk_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+
+    return {
+        "source": report.source,
+        "line": report.line,
+        "chats": report.chats,
+        "members": report.members,
+        "messages": report.messages,
+        "skipped": report.skipped,
+        "seconds": round(report.seconds, 3),
+        "rows_per_second": round(report.rows_per_second),
+        "errors": report.errors,
+    }
+
+
+@router.get("/stats/payloads", dependencies=[Depends(require_admin)])
+async def payload_stats():
+    # Counters are per process and reset on restart.
+    return {
+        "codec": payload_codec.codec,
+        "min_bytes": payload_codec.min_bytes,
+        **payload_codec.stats.snapshot(),
+    }
+
+
+@router.get("/stats/recent-messages", dependencies=[Depends(require_admin)])
+async def recent_message_stats():
+    # Counters are per process and reset on restart.
+    return recent_messages.snapshot()
@@ -21,7 +21,8 @@ from app.schemas.user import (
     UserSignup,
 )
 from app.schemas.token import Token
-from app.models.settings import UserSettings
+from app.models.settings import UserSettings, default_settings
+from app.services.user_index import user_index
 
 CurrentAuth = tuple[User, Session]
 
@@ -72,6 +73,9 @@ async def signup(
             detail="Failed to create user, please try again",
         ) from e
 
+    user_index.upsert(
+        new_user.user_id, new_user.normalized_username, new_user.display_username
+    )
     return PublicUser.model_validate(new_user)
 
 
@@ -97,7 +101,9 @@ async def signin(
     stmt_settings = select(UserSettings).where(UserSettings.user_id == exists.user_id)
     res_settings = await db.execute(stmt_settings)
     settings = res_settings.scalar_one_or_none()
-    max_sessions = settings.max_sessions if settings else 5
+    max_sessions = (
+        settings.max_sessions if settings else default_settings()["max_sessions"]
+    )
 
     stmt_sessions = (
         select(Session)
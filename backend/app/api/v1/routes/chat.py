@@ -1,20 +1,75 @@
-from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, func
+from datetime import datetime
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 from typing import List
 
-from app.core.user_settings import get_current_user, get_db
+from app.core.config import settings
+from app.core.http_cache import (
+    REVALIDATE,
+    chat_list_etag,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from app.core.receipts import receipts
+from app.core.recent_messages import recent_messages
+from app.core.user_settings import get_current_auth, get_current_user, get_db
+from app.core.dedup import recent_sends
+from app.crud.chat import (
+    ClientMsgIdConflict,
+    add_chat_members,
+    add_message_once,
+    add_messages,
+    get_chat_members,
+    get_changes_since,
+    get_unread_counts,
+    is_chat_member,
+    is_group_admin,
+    mark_read,
+    merge_archived,
+    next_expiry,
+    not_expired,
+    remove_chat_members,
+    resolve_history_cursor,
+    search_messages,
+)
 from app.models.chat import Chat, ChatMembers, Message
 from app.models.user import User
 from app.models.session import Session
+from app.services.export import stream_chat_export
+from app.worker import broadcast_relay
 from app.schemas.chat import (
     ChatType,
     ChatOut,
+    ChatMember,
     ChatMembersRole,
+    GroupCreate,
+    GroupMembersAdd,
+    GroupMembersChanged,
+    GroupMembersIn,
     Message as MessageSchema,
+    MessageIn,
     MessageStatus,
+    SyncPage,
+    SearchPage,
+    ChatUnread,
+    MAX_CLIENT_MSG_ID_LENGTH,
+    MAX_MESSAGE_LENGTH,
+    MAX_MESSAGE_TTL_SECONDS,
+    MAX_SEND_BATCH,
 )
 
 import traceback
@@ -91,56 +146,285 @@ async def create_private_chat(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chats/group", response_model=ChatOut)
+async def create_group_chat(
+    body: GroupCreate,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    chat = Chat(type=ChatType.group, title=body.title)
+    db.add(chat)
+    await db.flush()
+
+    await add_chat_members(
+        db, chat.chat_id, [current_user.user_id], ChatMembersRole.admin
+    )
+    await add_chat_members(db, chat.chat_id, body.member_ids, ChatMembersRole.member)
+    await db.commit()
+    await db.refresh(chat)
+    return chat
+
+
+@router.get("/chats/{chat_id}/members", response_model=List[ChatMember])
+async def list_chat_members(
+    chat_id: uuid.UUID,
+    after: uuid.UUID | None = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # Keyset pages by user_id, so large rosters are never loaded whole.
+    if not await is_chat_member(db, chat_id, current_user.user_id):
+        raise HTTPException(status_code=403, detail="Not a member of this chat")
+    return await get_chat_members(db, chat_id, after, limit)
+
+
+@router.post("/chats/{chat_id}/members", response_model=GroupMembersChanged)
+async def add_group_members(
+    chat_id: uuid.UUID,
+    body: GroupMembersAdd,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if not await db.scalar(select(is_group_admin(chat_id, current_user.user_id))):
+        raise HTTPException(status_code=403, detail="Not an admin of this group")
+
+    added = await add_chat_members(db, chat_id, body.user_ids, body.role)
+    await db.commit()
+    return GroupMembersChanged(chat_id=chat_id, changed=added)
+
+
+@router.post("/chats/{chat_id}/members/remove", response_model=GroupMembersChanged)
+async def remove_group_members(
+    chat_id: uuid.UUID,
+    body: GroupMembersIn,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # Admins may remove anyone; everyone else only themselves.
+    removed = await remove_chat_members(
+        db, chat_id, current_user.user_id, body.user_ids
+    )
+    await db.commit()
+    return GroupMembersChanged(chat_id=chat_id, changed=removed)
+
+
+@router.get("/chats/sync", response_model=SyncPage)
+async def sync_changes(
+    since: datetime | None = None,
+    after_id: uuid.UUID | None = None,
+    limit: int = Query(100, ge=1, le=500),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    messages, watermark, has_more = await get_changes_since(
+        db=db,
+        user_id=current_user.user_id,
+        since=since,
+        after_id=after_id,
+        limit=limit,
+    )
+    if watermark is None:
+        # Nothing new: hand the client its own watermark back.
+        return SyncPage(
+            messages=[],
+            next_since=since,
+            next_after_id=str(after_id) if after_id else None,
+        )
+
+    return SyncPage(
+        messages=messages,
+        next_since=watermark[0],
+        next_after_id=str(watermark[1]),
+        has_more=has_more,
+    )
+
+
+@router.get("/chats/search", response_model=SearchPage)
+async def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: uuid.UUID | None = None,
+    after_score: float | None = None,
+    after_id: uuid.UUID | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if (after_score is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400, detail="after_score and after_id go together"
+        )
+    after = (after_score, after_id) if after_id is not None else None
+    hits, next_key, has_more = await search_messages(
+        db,
+        user_id=current_user.user_id,
+        query=q,
+        chat_id=chat_id,
+        after=after,
+        limit=limit,
+    )
+    return SearchPage(
+        hits=hits,
+        next_score=next_key[0] if next_key else None,
+        next_after_id=str(next_key[1]) if next_key else None,
+        has_more=has_more,
+    )
+
+
+# Bounded and without immutable: a settled page can still change on a rename.
+HISTORY_CACHE = f"private, max-age={settings.history_cache_max_age}"
+
+
+def _is_settled(page: list[dict], before: uuid.UUID | None) -> bool:
+    # A page behind a cursor never gains messages. Once all of them are read
+    # and none can expire, only a sender rename could still change it. Group
+    # messages keep status sent (reads are per member), so they never settle.
+    return before is not None and all(
+        m["status"] == MessageStatus.read and m["expires_at"] is None for m in page
+    )
+
+
 @router.get("/chats/{chat_id}/messages", response_model=List[MessageSchema])
 async def get_messages(
     chat_id: uuid.UUID,
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=200),
+    before: uuid.UUID | None = None,
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    # Verify user is in the chat
-    member_check = await db.execute(
-        select(ChatMembers).where(
-            ChatMembers.chat_id == chat_id, ChatMembers.user_id == current_user.user_id
+    # Membership check and validator in one round trip, before the page query.
+    # Expiry changes a page without touching the chat row, so the next message
+    # due to expire is part of the validator too.
+    version = (
+        await db.execute(
+            select(Chat.last_seq, Chat.changed_at, next_expiry())
+            .join(ChatMembers, ChatMembers.chat_id == Chat.chat_id)
+            .where(
+                Chat.chat_id == chat_id, ChatMembers.user_id == current_user.user_id
+            )
         )
-    )
-    if not member_check.scalar_one_or_none():
+    ).first()
+    if version is None:
         raise HTTPException(status_code=403, detail="Not a member of this chat")
+    last_seq, changed_at, expires_next = version
+    etag = make_etag(chat_id, last_seq, changed_at, expires_next, limit, before)
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE)
+
+    first_page = limit is not None and before is None
+    if first_page:
+        cached = recent_messages.page(chat_id, last_seq, changed_at, limit)
+        if cached is not None:
+            return Response(
+                content=cached,
+                media_type="application/json",
+                headers={"ETag": etag, "Cache-Control": REVALIDATE},
+            )
 
     # Fetch messages joined with user for usernames
     statement = (
         select(Message, User.display_username)
         .join(User, Message.sender_id == User.user_id)
-        .where(Message.chat_id == chat_id)
-        .order_by(Message.created_at.asc())
+        .where(Message.chat_id == chat_id, not_expired())
     )
-    result = await db.execute(statement)
+    before_key = None
+    if before is not None:
+        # Keyset on (created_at, message_id): ids are time-ordered, so they
+        # settle ties between messages stamped with the same created_at. The
+        # literal created_at bound lets Postgres prune newer partitions.
+        before_key = await resolve_history_cursor(db, chat_id, before)
+        if before_key is None:
+            # An empty page would read as the start of history.
+            raise HTTPException(status_code=404, detail="Unknown history cursor")
+        statement = statement.where(
+            Message.created_at <= before_key[0],
+            tuple_(Message.created_at, Message.message_id) < before_key,
+        )
 
-    return [
+    if limit is None:
+        statement = statement.order_by(
+            Message.created_at.asc(), Message.message_id.asc()
+        )
+        rows = (await db.execute(statement)).all()
+    else:
+        # Newest page first from the index, then flipped back to oldest-first.
+        statement = statement.order_by(
+            Message.created_at.desc(), Message.message_id.desc()
+        ).limit(limit)
+        rows = (await db.execute(statement)).all()[::-1]
+
+    hot = [
         {
             "message_id": str(msg.message_id),
             "chat_id": str(msg.chat_id),
             "sender_id": str(msg.sender_id),
             "sender_username": uname,
             "sender_device_id": str(msg.sender_device_id),
+            "seq": msg.seq,
+            "client_msg_id": msg.client_msg_id,
             "payload": msg.payload,
             "created_at": msg.created_at,
             "updated_at": msg.updated_at,
+            "expires_at": msg.expires_at,
             "status": msg.status,
             "receiver_id": None,
             "receiver_device_id": None,
             "receiver_username": None,
         }
-        for msg, uname in result.all()
+        for msg, uname in rows
     ]
+    # Anything older than the hot window is served from archive segments.
+    page = await merge_archived(db, chat_id, hot, before_key, limit)
+    if first_page:
+        # A short first page is the whole chat.
+        recent_messages.fill(
+            chat_id, last_seq, changed_at, page, complete=len(page) < limit
+        )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = (
+        HISTORY_CACHE if _is_settled(page, before) else REVALIDATE
+    )
+    return page
+
+
+@router.get("/chats/{chat_id}/export")
+async def export_chat(
+    chat_id: uuid.UUID,
+    gzip: bool = False,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    member_check = await db.execute(
+        select(ChatMembers).where(
+            ChatMembers.chat_id == chat_id, ChatMembers.user_id == current_user.user_id
+        )
+    )
+    if not member_check.scalar_one_or_none():
+        raise HTTPException(status_code=403, detail="Not a member of this chat")
+
+    filename = f"chat-{chat_id}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_chat_export(chat_id, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.post("/chats/{chat_id}/messages", response_model=MessageSchema)
 async def send_message(
     chat_id: uuid.UUID,
-    payload: str,
-    current_user=Depends(get_current_user),
+    payload: str = Query(..., min_length=1, max_length=MAX_MESSAGE_LENGTH),
+    client_msg_id: str | None = Query(
+        None, min_length=1, max_length=MAX_CLIENT_MSG_ID_LENGTH
+    ),
+    ttl_seconds: int | None = Query(None, ge=1, le=MAX_MESSAGE_TTL_SECONDS),
+    auth: tuple[User, Session] = Depends(get_current_auth),
     db: AsyncSession = Depends(get_db),
 ):
+    # The device is the session that made this request.
+    current_user, user_session = auth
     try:
         # Verify membership
         member_check = await db.execute(
@@ -152,55 +436,166 @@ async def send_message(
         if not member_check.scalar_one_or_none():
             raise HTTPException(status_code=403, detail="Not a member of this chat")
 
-        # Get session for device ID
-        session_result = await db.execute(
-            select(Session).where(Session.user_id == current_user.user_id).limit(1)
-        )
-        user_session = session_result.scalar_one_or_none()
-        if not user_session:
-            raise HTTPException(status_code=400, detail="No active session found.")
-
-        new_message = Message(
+        new_message, created = await add_message_once(
+            db,
             chat_id=chat_id,
             sender_id=current_user.user_id,
             sender_device_id=user_session.id,
             payload=payload,
-            created_at=datetime.now(timezone.utc),
-            status=MessageStatus.sent,
+            client_msg_id=client_msg_id,
+            ttl_seconds=ttl_seconds,
         )
-
-        db.add(new_message)
         await db.commit()
-        await db.refresh(new_message)
-
-        return {
-            "message_id": str(new_message.message_id),
-            "chat_id": str(new_message.chat_id),
-            "sender_id": str(new_message.sender_id),
-            "sender_username": current_user.display_username,
-            "sender_device_id": str(new_message.sender_device_id),
-            "payload": new_message.payload,
-            "created_at": new_message.created_at,
-            "updated_at": None,
-            "status": new_message.status,
-            "receiver_id": None,
-            "receiver_device_id": None,
-            "receiver_username": None,
-        }
+        if created:
+            broadcast_relay.wake()
+            if client_msg_id is not None:
+                recent_sends.remember((user_session.id, client_msg_id), new_message)
+
+        return new_message
 
     except HTTPException:
         raise
+    except ClientMsgIdConflict:
+        await db.rollback()
+        raise HTTPException(
+            status_code=409, detail="client_msg_id already used in another chat"
+        )
     except Exception as e:
         await db.rollback()
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chats/messages/batch", response_model=List[MessageSchema])
+async def send_messages(
+    messages: List[MessageIn] = Body(..., min_length=1, max_length=MAX_SEND_BATCH),
+    auth: tuple[User, Session] = Depends(get_current_auth),
+    db: AsyncSession = Depends(get_db),
+):
+    # One membership check covers every chat in the batch; all or nothing.
+    current_user, user_session = auth
+    chat_ids = {m.chat_id for m in messages}
+    member_of = set(
+        await db.scalars(
+            select(ChatMembers.chat_id).where(
+                ChatMembers.user_id == current_user.user_id,
+                ChatMembers.chat_id.in_(chat_ids),
+            )
+        )
+    )
+    if member_of != chat_ids:
+        raise HTTPException(status_code=403, detail="Not a member of every chat")
+
+    try:
+        results = await add_messages(
+            db,
+            sender_id=current_user.user_id,
+            sender_device_id=user_session.id,
+            items=messages,
+        )
+        await db.commit()
+    except ClientMsgIdConflict:
+        await db.rollback()
+        raise HTTPException(
+            status_code=409, detail="client_msg_id already used in another chat"
+        )
+    except IntegrityError:
+        # A concurrent retry of the same client_msg_id got in first.
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Duplicate send in flight; retry")
+
+    created = [message for message, is_new in results if is_new]
+    if created:
+        broadcast_relay.wake()
+    for message in created:
+        if message.client_msg_id is not None:
+            recent_sends.remember((user_session.id, message.client_msg_id), message)
+    return [message for message, _ in results]
+
+
+@router.put("/chats/{chat_id}/ttl", response_model=ChatOut)
+async def set_chat_ttl(
+    chat_id: uuid.UUID,
+    seconds: int | None = Query(None, ge=1, le=MAX_MESSAGE_TTL_SECONDS),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # Applies to messages sent from now on; omit seconds to turn expiry off.
+    member_check = await db.execute(
+        select(ChatMembers).where(
+            ChatMembers.chat_id == chat_id,
+            ChatMembers.user_id == current_user.user_id,
+        )
+    )
+    if not member_check.scalar_one_or_none():
+        raise HTTPException(status_code=403, detail="Not a member of this chat")
+
+    chat = await db.get(Chat, chat_id)
+    if chat.type == ChatType.group and not await db.scalar(
+        select(is_group_admin(chat_id, current_user.user_id))
+    ):
+        raise HTTPException(status_code=403, detail="Not an admin of this group")
+    chat.message_ttl_seconds = seconds
+    await db.commit()
+    await db.refresh(chat)
+    return chat
+
+
+@router.post("/chats/{chat_id}/read", response_model=ChatUnread)
+async def mark_chat_read(
+    chat_id: uuid.UUID,
+    up_to_seq: int = Query(..., ge=1),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    advanced = await mark_read(
+        db, chat_id=chat_id, user_id=current_user.user_id, up_to_seq=up_to_seq
+    )
+    await db.commit()
+
+    unread = await get_unread_counts(db, current_user.user_id, chat_id=chat_id)
+    if not unread:
+        raise HTTPException(status_code=403, detail="Not a member of this chat")
+
+    # Let senders see the read receipt on the next flush.
+    if advanced:
+        receipts.ack(
+            str(chat_id), current_user.user_id, up_to_seq, MessageStatus.read
+        )
+    return unread[0]
+
+
+@router.get("/chats/unread", response_model=List[ChatUnread])
+async def get_chats_unread(
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await get_unread_counts(db, current_user.user_id)
+
+
 @router.get("/chats", response_model=List[ChatOut])
 async def get_chats(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
+    # Joins and leaves touch the chat, so the newest changed_at moves on any
+    # join and the count drops on a leave.
+    version = (
+        await db.execute(
+            select(func.count(), func.max(Chat.changed_at))
+            .select_from(ChatMembers)
+            .join(Chat, Chat.chat_id == ChatMembers.chat_id)
+            .where(ChatMembers.user_id == current_user.user_id)
+        )
+    ).one()
+    etag = chat_list_etag(current_user.user_id, *version)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE)
+
     statement = (
         select(Chat)
         .join(ChatMembers)
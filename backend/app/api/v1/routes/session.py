@@ -10,14 +10,14 @@ from app.db.session import get_db
 from app.models.session import Session
 from app.schemas.session import SessionRead
 from app.api.v1.routes.auth import CurrentAuth
-from app.core.user_settings import get_current_user
+from app.core.user_settings import get_current_auth
 
 router = APIRouter()
 
 
 @router.get("/active-sessions", response_model=List[SessionRead])
 async def list_active_sessions(
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
     response: Response,
 ):
@@ -44,7 +44,7 @@ async def list_active_sessions(
     status_code=status.HTTP_200_OK,
 )
 async def terminate_session(
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
     session_id: UUID = Path(..., description="ID of the session to terminate"),
 ):
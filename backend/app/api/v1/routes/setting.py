@@ -7,20 +7,23 @@ from sqlalchemy.exc import IntegrityError
 
 from app.db.session import get_db
 from app.core.security import hash_password, verify_password
-from app.core.user_settings import get_current_user
+from app.core.user_settings import get_current_auth
+from app.crud.chat import touch_chats
+from app.models.chat import ChatMembers
 from app.models.user import User
 from app.models.session import Session
-from app.models.settings import UserSettings
+from app.models.settings import UserSettings, default_settings
 from app.schemas.user import UserDelete, UserUpdate, UserRead, normalize_username
 from app.schemas.settings import SettingsRead, SettingsUpdate
 from app.api.v1.routes.auth import CurrentAuth
+from app.services.user_index import user_index
 
 router = APIRouter()
 
 
 @router.get("/max-sessions")
 async def get_max_sessions(
-    auth: CurrentAuth = Depends(get_current_user), db: AsyncSession = Depends(get_db)
+    auth: CurrentAuth = Depends(get_current_auth), db: AsyncSession = Depends(get_db)
 ):
     current_user, _ = auth
 
@@ -29,9 +32,7 @@ async def get_max_sessions(
     settings = result.scalar_one_or_none()
 
     if not settings:
-        settings = UserSettings(
-            user_id=current_user.user_id, max_sessions=2, notifications_enabled=True
-        )
+        settings = UserSettings(user_id=current_user.user_id, **default_settings())
         db.add(settings)
         await db.commit()
         await db.refresh(settings)
@@ -41,7 +42,7 @@ async def get_max_sessions(
 
 @router.get("/settings", response_model=SettingsRead)
 async def get_user_settings(
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
     current_user, _ = auth
@@ -51,11 +52,7 @@ async def get_user_settings(
     settings = result.scalar_one_or_none()
 
     if not settings:
-        settings = UserSettings(
-            user_id=current_user.user_id,
-            max_sessions=2,
-            notifications_enabled=True,
-        )
+        settings = UserSettings(user_id=current_user.user_id, **default_settings())
         db.add(settings)
         await db.commit()
         await db.refresh(settings)
@@ -66,7 +63,7 @@ async def get_user_settings(
 @router.put("/settings/profile", response_model=UserRead)
 async def update_profile(
     update_data: Annotated[UserUpdate, Form()],
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
     current_user, _ = auth
@@ -86,6 +83,13 @@ async def update_profile(
 
             current_user.display_username = update_data.new_username
             current_user.normalized_username = normalized_new
+            # Message pages cached by the user's chats carry the old name.
+            await touch_chats(
+                db,
+                select(ChatMembers.chat_id).where(
+                    ChatMembers.user_id == current_user.user_id
+                ),
+            )
 
     if update_data.new_password is not None:
         if update_data.current_password is None:
@@ -117,13 +121,18 @@ async def update_profile(
             detail="Username already taken",
         )
 
+    user_index.upsert(
+        current_user.user_id,
+        current_user.normalized_username,
+        current_user.display_username,
+    )
     return UserRead.model_validate(current_user)
 
 
 @router.patch("/settings", response_model=SettingsRead)
 async def update_user_settings(
     update_data: Annotated[SettingsUpdate, Form()],
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
     current_user, _ = auth
@@ -132,9 +141,7 @@ async def update_user_settings(
     result = await db.execute(statement)
     settings = result.scalar_one_or_none()
     if not settings:
-        settings = UserSettings(
-            user_id=current_user.user_id, max_sessions=2, notifications_enabled=True
-        )
+        settings = UserSettings(user_id=current_user.user_id, **default_settings())
         db.add(settings)
         await db.commit()
         await db.refresh(settings)
@@ -154,7 +161,7 @@ async def update_user_settings(
 @router.delete("/settings/account-delete")
 async def account_delete(
     delete_data: Annotated[UserDelete, Form()],
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
     current_user, _ = auth
@@ -168,5 +175,6 @@ async def account_delete(
     await db.execute(delete(User).where(User.user_id == current_user.user_id))
 
     await db.commit()
+    user_index.remove(current_user.user_id)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,17 +1,22 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Query, Response
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
 from app.db.session import get_db
-from app.core.user_settings import get_current_user
+from app.core.user_settings import get_current_auth, get_current_user
+from app.crud.chat import touch_chats
+from app.models.chat import ChatMembers
 from app.models.user import User
+from app.schemas.bootstrap import Bootstrap
 from app.schemas.user import UserRead, UserUpdate, normalize_username
 from app.api.v1.routes.auth import CurrentAuth
 from app.models.session import Session
 from app.core.security import hash_password, verify_password
+from app.services.bootstrap import load_bootstrap
+from app.services.user_index import search_users, user_index
 
 
 router = APIRouter()
@@ -24,10 +29,37 @@ async def me_endpoint(
     return UserRead.model_validate(current_user)
 
 
+@router.get("/bootstrap", response_model=Bootstrap)
+async def bootstrap(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    response: Response,
+):
+    # One authenticated round trip in place of /me, /settings,
+    # /sessions/active-sessions and /chats on launch.
+    response.headers["Cache-Control"] = "no-store"
+    return await load_bootstrap(db, current_user)
+
+
+@router.get("/search", response_model=list[UserRead])
+async def search_usernames(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    q: Annotated[str, Query(min_length=1, max_length=50)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+    hits = await search_users(db, q, limit + 1)
+    return [
+        UserRead(user_id=str(user_id), display_username=display)
+        for user_id, display in hits
+        if user_id != current_user.user_id
+    ][:limit]
+
+
 @router.put("/me", response_model=UserRead)
 async def update_current_user(
     update_data: Annotated[UserUpdate, Form()],
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
     current_user, _ = auth
@@ -47,6 +79,13 @@ async def update_current_user(
 
             current_user.display_username = update_data.new_username
             current_user.normalized_username = normalized_new
+            # Message pages cached by the user's chats carry the old name.
+            await touch_chats(
+                db,
+                select(ChatMembers.chat_id).where(
+                    ChatMembers.user_id == current_user.user_id
+                ),
+            )
 
     if update_data.new_password is not None:
         if update_data.current_password is None:
@@ -78,12 +117,17 @@ async def update_current_user(
             detail="Username already taken",
         )
 
+    user_index.upsert(
+        current_user.user_id,
+        current_user.normalized_username,
+        current_user.display_username,
+    )
     return UserRead.model_validate(current_user)
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
 async def logout(
-    auth: Annotated[CurrentAuth, Depends(get_current_user)],
+    auth: Annotated[CurrentAuth, Depends(get_current_auth)],
     db: Annotated[AsyncSession, Depends(get_db)],
 ):
     _, current_session = auth
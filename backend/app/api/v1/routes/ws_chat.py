@@ -1,16 +1,88 @@
 from fastapi import APIRouter, WebSocket, Depends, WebSocketDisconnect, status
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import uuid
-import json
 
+from app.core.config import settings
+from app.core.fanout import OfflineFanout
+from app.core.presence import PresencePublisher
+from app.core.heartbeat import HeartbeatWheel
+from app.core.rate_limit import RateLimiter, TokenBucket
+from app.core.receipts import receipts
+from app.core.recent_messages import recent_messages
+from app.core.typing_indicators import TypingTracker
 from app.core.user_settings import get_current_user_ws, get_db
-from app.crud.chat import add_message, is_chat_member
+from app.core.wire import negotiate
+from app.core.dedup import recent_sends
+from app.crud.chat import ClientMsgIdConflict, add_message_once, is_chat_member
 from app.models.chat import Chat
-from app.schemas.chat import Message as MessageSchema
-from app.core.ws_settings import ConnectionManager
+from app.services.notifications import enqueue_notifications
+from app.worker import INSTANCE_NAME, broadcast_relay, outbox_relay
+from app.schemas.ws import AckFrame, PongFrame, SendMessageFrame, TypingFrame
+from app.core.ws_settings import manager
 
 router = APIRouter()
-manager = ConnectionManager()
+offline_fanout = OfflineFanout(
+    sink=enqueue_notifications,
+    batch_size=settings.offline_fanout_batch_size,
+    presence_ttl=settings.presence_ttl,
+)
+presence = PresencePublisher(
+    manager,
+    instance=INSTANCE_NAME[:64],
+    interval=settings.presence_interval,
+    ttl=settings.presence_ttl,
+)
+typing_tracker = TypingTracker(
+    manager, tick_interval=settings.ws_typing_tick_interval, ttl=settings.ws_typing_ttl
+)
+heartbeats = HeartbeatWheel(
+    manager,
+    ping_interval=settings.ws_ping_interval,
+    ping_timeout=settings.ws_ping_timeout,
+    idle_timeout=settings.ws_idle_timeout,
+)
+
+
+async def broadcast_message(kind: str, chat_id: uuid.UUID, message: dict) -> None:
+    # Local outbox consumer: every process feeds its own sockets and cache.
+    if kind != "message":
+        return
+    sender_device = uuid.UUID(message["sender_device_id"])
+    await manager.broadcast(str(chat_id), message, exclude_device=sender_device)
+    recent_messages.append(chat_id, message)
+
+
+async def notify_offline(kind: str, chat_id: uuid.UUID, message: dict) -> None:
+    # Shared outbox consumer: runs once per deployment, not once per process.
+    # Awaited, so the relay only moves past the event once digests are queued.
+    if kind != "message":
+        return
+    await offline_fanout.deliver(chat_id, message)
+
+
+broadcast_relay.subscribe(broadcast_message)
+outbox_relay.subscribe(notify_offline)
+
+
+# (rate per second, burst) per connection; per-user buckets get a multiple of it.
+_EVENT_LIMITS = {
+    "send_message": (settings.ws_message_rate, settings.ws_message_burst),
+    "typing": (settings.ws_event_rate, settings.ws_event_burst),
+    "ack": (settings.ws_event_rate, settings.ws_event_burst),
+    "pong": (settings.ws_event_rate, settings.ws_event_burst),
+}
+user_limits = {
+    event: RateLimiter(
+        rate * settings.ws_user_rate_multiplier,
+        burst * settings.ws_user_rate_multiplier,
+    )
+    for event, (rate, burst) in _EVENT_LIMITS.items()
+}
+# FIFO semaphore: DB work from all sockets queues fairly instead of one busy
+# socket holding every pooled connection.
+db_slots = asyncio.Semaphore(settings.ws_db_concurrency)
 
 
 @router.websocket("/ws/chat/{chat_id}")
@@ -33,7 +105,7 @@ async def chat_ws(
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
-        is_member = await is_chat_member(db=db, chat_id=chat_uuid, user_id=user.id)
+        is_member = await is_chat_member(db=db, chat_id=chat_uuid, user_id=user.user_id)
 
         if not is_member:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
@@ -43,40 +115,115 @@ async def chat_ws(
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    await manager.connect(chat_id, websocket)
+    codec = negotiate(websocket.scope.get("subprotocols", []))
+    await manager.connect(
+        chat_id, websocket, codec, user_id=user.user_id, device_id=session.id
+    )
+    heartbeats.register(websocket, chat_id)
+
+    frame_bucket = TokenBucket(settings.ws_frame_rate, settings.ws_frame_burst)
+    event_buckets = {
+        event: TokenBucket(rate, burst) for event, (rate, burst) in _EVENT_LIMITS.items()
+    }
+    violations = 0
 
     try:
         while True:
-            try:
-                data = await websocket.receive_json()
-            except json.JSONDecodeError:
-                await websocket.send_json({"error": "Invalid JSON format"})
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            # Size and rate checks run before any decoding work is spent.
+            raw = message.get("bytes") or message.get("text") or ""
+            size = len(raw) if isinstance(raw, bytes) else len(raw.encode())
+            if size > settings.ws_max_frame_bytes:
+                error = "Frame too large"
+            elif not frame_bucket.take():
+                error = "Rate limit exceeded"
+            else:
+                try:
+                    frame = codec.decode(raw)
+                except (ValidationError, ValueError):
+                    error = "Invalid frame"
+                else:
+                    event = frame.event
+                    if event_buckets[event].take() and user_limits[event].allow(
+                        user.user_id
+                    ):
+                        error = None
+                    else:
+                        error = "Rate limit exceeded"
+
+            if error is not None:
+                violations += 1
+                if violations > settings.ws_max_violations:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    break
+                await manager.send(websocket, {"error": error})
                 continue
+            violations = 0
 
-            event_type = data.get("event")
-            payload = data.get("payload")
+            # Pongs prove liveness but do not keep an idle socket open.
+            heartbeats.touch(websocket, active=not isinstance(frame, PongFrame))
 
-            if event_type == "send_message":
+            if isinstance(frame, SendMessageFrame):
                 try:
-                    message: MessageSchema = await add_message(
-                        db=db,
-                        chat_id=chat_uuid,
-                        sender_id=user.id,
-                        sender_device_id=session.id,
-                        payload=payload,
+                    async with db_slots:
+                        saved, created = await add_message_once(
+                            db=db,
+                            chat_id=chat_uuid,
+                            sender_id=user.user_id,
+                            sender_device_id=session.id,
+                            payload=frame.payload,
+                            client_msg_id=frame.client_msg_id,
+                            ttl_seconds=frame.ttl_seconds,
+                        )
+                        await db.commit()
+                except ClientMsgIdConflict:
+                    await db.rollback()
+                    await manager.send(
+                        websocket,
+                        {
+                            "error": "client_msg_id already used in another chat",
+                            "client_msg_id": frame.client_msg_id,
+                        },
                     )
-                    await db.commit()
-                    await manager.broadcast(chat_id, message.dict(), exclude=websocket)
+                    continue
                 except Exception:
-                    await websocket.send_json({"error": "Failed to save message"})
+                    await db.rollback()
+                    await manager.send(websocket, {"error": "Failed to save message"})
+                    continue
+
+                if created:
+                    if frame.client_msg_id is not None:
+                        recent_sends.remember((session.id, frame.client_msg_id), saved)
+                    broadcast_relay.wake()
+                await manager.send(
+                    websocket,
+                    {
+                        "event": "sent",
+                        "client_msg_id": frame.client_msg_id,
+                        "message_id": saved.message_id,
+                        "seq": saved.seq,
+                    },
+                )
+
+            elif isinstance(frame, TypingFrame):
+                stopped = frame.payload is not None and frame.payload.state == "stop"
+                typing_tracker.set_typing(chat_id, user.user_id, not stopped)
 
-            elif event_type == "typing":
-                await manager.broadcast(
-                    chat_id,
-                    {"event": "typing", "user_id": str(user.id)},
-                    exclude=websocket,
+            elif isinstance(frame, AckFrame):
+                receipts.ack(
+                    chat_id=chat_id,
+                    user_id=user.user_id,
+                    seq=frame.payload.seq,
+                    status=frame.payload.status,
                 )
     except WebSocketDisconnect:
         pass
     finally:
-        manager.disconnect(chat_id, websocket)
\ No newline at end of file
+        heartbeats.unregister(websocket)
+        manager.disconnect(chat_id, websocket)
+        # Another socket of the same user may still be typing in this room.
+        if not manager.is_online(chat_id, user.user_id):
+            typing_tracker.set_typing(chat_id, user.user_id, False)
\ No newline at end of file
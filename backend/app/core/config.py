@@ -16,6 +16,88 @@ class Settings(BaseSettings):
     cors_origins: str = "http://localhost:3000"
     host: str = "0.0.0.0"
     port: int = 8000
+    ws_receipt_flush_interval: float = 1.0
+    ws_typing_tick_interval: float = 0.5
+    ws_typing_ttl: float = 5.0
+    ws_ping_interval: float = 25.0
+    ws_ping_timeout: float = 10.0
+    ws_idle_timeout: float = 900.0
+    ws_max_frame_bytes: int = 16384
+    ws_frame_rate: float = 20.0
+    ws_frame_burst: float = 60.0
+    ws_message_rate: float = 5.0
+    ws_message_burst: float = 20.0
+    ws_event_rate: float = 10.0
+    ws_event_burst: float = 30.0
+    ws_user_rate_multiplier: float = 2.0
+    ws_max_violations: int = 50
+    ws_db_concurrency: int = 4
+    # Rooms with this many open sockets broadcast through the shard workers.
+    ws_fanout_threshold: int = 100
+    ws_fanout_workers: int = 8
+    # Broadcast batches queued per fan-out worker before its sockets are shed.
+    ws_fanout_queue_size: int = 1000
+    ws_send_timeout: float = 10.0
+    # Messages in chats with more members than this carry no receiver lists.
+    message_receivers_max: int = 100
+    offline_fanout_batch_size: int = 1000
+    # Each process publishes its online chat members this often; rows of a
+    # process that stopped re-stamping them stop counting after presence_ttl.
+    presence_interval: float = 1.0
+    presence_ttl: float = 30.0
+    # Messages to an offline member within this window share one digest.
+    notification_digest_seconds: float = 60.0
+    notification_poll_interval: float = 5.0
+    notification_batch_size: int = 500
+    notification_max_attempts: int = 5
+    # "log" or "file"; the file sink appends JSON lines to notification_file.
+    notification_sink: str = "log"
+    notification_file: str = "notifications.jsonl"
+    # Names this process's broadcast cursor; defaults to host:pid.
+    instance_name: str | None = None
+    outbox_poll_interval: float = 1.0
+    outbox_batch_size: int = 500
+    # How long a hole in outbox ids may belong to a transaction still in flight.
+    outbox_gap_grace_seconds: float = 5.0
+    # Relayed events are kept this long before they are pruned.
+    outbox_retention_seconds: float = 3600.0
+    # Delta sync holds back changes this recent: changed_at is stamped before
+    # commit, so a slower transaction may still land behind them.
+    sync_grace_seconds: float = 5.0
+    dedup_window_seconds: float = 120.0
+    dedup_window_size: int = 50_000
+    message_purge_interval: float = 30.0
+    message_purge_bucket_seconds: float = 300.0
+    message_purge_batch_size: int = 1000
+    message_purge_max_batches: int = 50
+    message_partition_months_ahead: int = 3
+    message_partition_check_interval: float = 6 * 3600.0
+    # Months of partitions to keep attached; 0 keeps everything.
+    message_partition_retention_months: int = 0
+    message_partition_drop_detached: bool = False
+    archive_dir: str = "archive"
+    # Messages older than this move to segment files; 0 disables archiving.
+    archive_after_days: int = 0
+    archive_interval: float = 3600.0
+    archive_block_messages: int = 256
+    archive_segment_messages: int = 10_000
+    archive_chats_per_run: int = 100
+    archive_open_chats: int = 256
+    # Enables the /admin routes when set; sent as the X-Admin-Token header.
+    admin_token: SecretStr | None = None
+    import_chunk_size: int = 5000
+    user_index_refresh_interval: float = 300.0
+    # "zlib", "zstd" (Python 3.14+) or "none"; reads understand every codec.
+    payload_compression: str = "zlib"
+    payload_compression_min_bytes: int = 1024
+    payload_compression_level: int = 6
+    # max-age for history pages whose messages are all read and never expire;
+    # kept short since a sender rename still changes them.
+    history_cache_max_age: int = 3600
+    # Newest history rows kept in memory per hot chat, and the byte budget for
+    # all chats together; see app.core.recent_messages.
+    recent_messages_per_chat: int = 50
+    recent_messages_max_bytes: int = 64 * 1024 * 1024
 
 
 settings = Settings()  # type: ignore
\ No newline at end of file
@@ -0,0 +1,42 @@
+import time
+import uuid
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.schemas.chat import Message as MessageSchema
+
+DedupKey = tuple[uuid.UUID, str]
+
+
+class DedupWindow:
+    """Recently committed sends by (sender_device_id, client_msg_id).
+
+    Absorbs client retries without a DB round trip; anything older than the
+    window falls through to the unique constraint on messages.
+    """
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[DedupKey, tuple[float, MessageSchema]] = OrderedDict()
+
+    def get(self, key: DedupKey) -> MessageSchema | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, message = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        return message
+
+    def remember(self, key: DedupKey, message: MessageSchema) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, message)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+recent_sends = DedupWindow(
+    ttl=settings.dedup_window_seconds, max_entries=settings.dedup_window_size
+)
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import uuid
+from collections.abc import Awaitable, Callable
+
+from fastapi import WebSocket
+from sqlalchemy import select
+
+from app.core.presence import online_anywhere
+from app.db.session import AsyncSessionLocal
+from app.models.chat import ChatMembers
+
+logger = logging.getLogger(__name__)
+
+# Sends one frame to one socket; expected to handle its own failures.
+SendFn = Callable[[WebSocket], Awaitable[None]]
+# (chat_id, message, offline member ids) -> delivered somewhere else
+OfflineSink = Callable[[uuid.UUID, dict, list[uuid.UUID]], Awaitable[None]]
+
+
+class FanoutPool:
+    """Shard workers that deliver large-room broadcasts off the caller's task.
+
+    Every socket is pinned to one worker by identity, so frames reach it in the
+    order they were broadcast, and a slow socket only delays the sockets that
+    share its worker instead of the whole room. Each worker's queue is bounded;
+    sockets whose worker is that far behind are handed back to the caller.
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queues: list[asyncio.Queue[tuple[list[WebSocket], SendFn]]] = []
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _shard(self, connection: WebSocket) -> int:
+        # Object ids are allocation-aligned, so they are mixed before the modulo
+        # (Fibonacci hashing) or most sockets would land on a couple of workers.
+        return ((id(connection) * 0x9E3779B97F4A7C15) >> 32) % self.workers
+
+    def submit(self, connections: list[WebSocket], send: SendFn) -> list[WebSocket]:
+        """Queue `send` for every connection; returns the ones it was not."""
+        shards: dict[int, list[WebSocket]] = {}
+        for connection in connections:
+            shards.setdefault(self._shard(connection), []).append(connection)
+        dropped: list[WebSocket] = []
+        for index, shard in shards.items():
+            try:
+                self._queues[index].put_nowait((shard, send))
+            except asyncio.QueueFull:
+                dropped.extend(shard)
+        if dropped:
+            logger.warning("Fan-out queue full; dropped %d sockets", len(dropped))
+        return dropped
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            connections, send = await queue.get()
+            for connection in connections:
+                try:
+                    await send(connection)
+                except Exception:
+                    logger.exception("Fan-out send failed")
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._queues = [
+                asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)
+            ]
+            self._tasks = [asyncio.create_task(self._run(q)) for q in self._queues]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._queues = []
+
+
+class OfflineFanout:
+    """Hands each new message's offline members to a sink.
+
+    Called from the shared outbox consumer and awaited there, so a failure
+    holds the relay's cursor and the message is offered again. The roster is
+    streamed from the database in batches and filtered against chat_presence,
+    which covers the sockets open on every process, so a large room is never
+    held in memory whole.
+    """
+
+    def __init__(self, sink: OfflineSink, batch_size: int, presence_ttl: float) -> None:
+        self.sink = sink
+        self.batch_size = batch_size
+        self.presence_ttl = presence_ttl
+
+    async def deliver(self, chat_id: uuid.UUID, message: dict) -> None:
+        sender_id = uuid.UUID(message["sender_id"])
+        online = online_anywhere(
+            ChatMembers.chat_id, ChatMembers.user_id, self.presence_ttl
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(ChatMembers.user_id)
+                .where(
+                    ChatMembers.chat_id == chat_id,
+                    ChatMembers.user_id != sender_id,
+                    ~online,
+                )
+                .execution_options(yield_per=self.batch_size)
+            )
+            async for batch in result.scalars().partitions():
+                await self.sink(chat_id, message, list(batch))
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from fastapi import WebSocket, status
+
+from app.core.ws_settings import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Heartbeat:
+    chat_id: str
+    last_seen: float
+    last_active: float
+    ping_sent: float | None = None
+
+
+class HeartbeatWheel:
+    """One timer wheel per worker that pings, times out and evicts sockets.
+
+    Each socket sits in exactly one slot and is only looked at when the wheel
+    reaches that slot, so a tick costs O(sockets due), not O(sockets connected),
+    and no per-socket task or timer is ever created.
+    """
+
+    def __init__(
+        self,
+        manager: ConnectionManager,
+        ping_interval: float,
+        ping_timeout: float,
+        idle_timeout: float,
+        tick_interval: float = 1.0,
+    ) -> None:
+        self.manager = manager
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.idle_timeout = idle_timeout
+        self.tick_interval = tick_interval
+        size = math.ceil(max(ping_interval, ping_timeout) / tick_interval) + 2
+        self._slots: list[set[WebSocket]] = [set() for _ in range(size)]
+        self._cursor = 0
+        self._conns: dict[WebSocket, _Heartbeat] = {}
+        self._task: asyncio.Task | None = None
+
+    def _schedule(self, websocket: WebSocket, delay: float) -> None:
+        ticks = max(1, math.ceil(delay / self.tick_interval))
+        self._slots[(self._cursor + ticks) % len(self._slots)].add(websocket)
+
+    def register(self, websocket: WebSocket, chat_id: str) -> None:
+        now = time.monotonic()
+        self._conns[websocket] = _Heartbeat(chat_id, now, now)
+        self._schedule(websocket, self.ping_interval)
+
+    def unregister(self, websocket: WebSocket) -> None:
+        # The stale slot entry is skipped when the wheel reaches it.
+        self._conns.pop(websocket, None)
+
+    def touch(self, websocket: WebSocket, active: bool = True) -> None:
+        heartbeat = self._conns.get(websocket)
+        if heartbeat is None:
+            return
+        heartbeat.last_seen = time.monotonic()
+        if active:
+            heartbeat.last_active = heartbeat.last_seen
+
+    async def _ping(self, websocket: WebSocket) -> None:
+        try:
+            await asyncio.wait_for(
+                self.manager.send(websocket, {"event": "ping"}), self.ping_timeout
+            )
+        except Exception:
+            await self._evict(websocket)
+
+    async def _evict(self, websocket: WebSocket) -> None:
+        heartbeat = self._conns.pop(websocket, None)
+        if heartbeat is None:
+            return
+        self.manager.disconnect(heartbeat.chat_id, websocket)
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=status.WS_1001_GOING_AWAY), self.ping_timeout
+            )
+        except Exception:
+            pass
+
+    async def tick(self) -> None:
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        due, self._slots[self._cursor] = self._slots[self._cursor], set()
+
+        now = time.monotonic()
+        to_ping: list[WebSocket] = []
+        to_evict: list[WebSocket] = []
+        for websocket in due:
+            heartbeat = self._conns.get(websocket)
+            if heartbeat is None:
+                continue
+            if self.idle_timeout and now - heartbeat.last_active >= self.idle_timeout:
+                to_evict.append(websocket)
+            elif (
+                heartbeat.ping_sent is not None
+                and heartbeat.last_seen < heartbeat.ping_sent
+            ):
+                # No frame at all since the last ping: treat as half-open.
+                to_evict.append(websocket)
+            elif now - heartbeat.last_seen >= self.ping_interval:
+                heartbeat.ping_sent = now
+                to_ping.append(websocket)
+                self._schedule(websocket, self.ping_timeout)
+            else:
+                heartbeat.ping_sent = None
+                self._schedule(
+                    websocket, self.ping_interval - (now - heartbeat.last_seen)
+                )
+
+        if to_ping or to_evict:
+            await asyncio.gather(
+                *(self._ping(ws) for ws in to_ping),
+                *(self._evict(ws) for ws in to_evict),
+            )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Heartbeat tick failed")
@@ -0,0 +1,39 @@
+import hashlib
+import uuid
+from datetime import datetime
+
+from fastapi import Request, Response, status
+
+# Lists that change with chat activity: cache, but revalidate every time.
+REVALIDATE = "private, no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    # Hashes the few values a response is derived from, never the body itself.
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def chat_list_etag(
+    user_id: uuid.UUID, chat_count: int, newest_change: datetime | None
+) -> str:
+    # Shared by GET /chats and the bootstrap so either can revalidate the other.
+    return make_etag(user_id, chat_count, newest_change)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so a W/ prefix still matches.
+    tags = (tag.strip().removeprefix("W/") for tag in header.split(","))
+    return etag in tags
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
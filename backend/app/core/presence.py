@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete, exists, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.db.session import AsyncSessionLocal
+from app.models.presence import ChatPresence
+
+if TYPE_CHECKING:
+    from app.core.ws_settings import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+_Key = tuple[uuid.UUID, uuid.UUID]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Pairs per statement, well under SQLite's bound parameter limit.
+_BATCH = 1000
+
+
+def _chunks(keys: set[_Key]) -> list[list[_Key]]:
+    ordered = list(keys)
+    return [ordered[i : i + _BATCH] for i in range(0, len(ordered), _BATCH)]
+
+
+def online_anywhere(chat_id, user_id, ttl: float):
+    """EXISTS clause: the user has a socket open in the chat on some process."""
+    return exists().where(
+        ChatPresence.chat_id == chat_id,
+        ChatPresence.user_id == user_id,
+        ChatPresence.seen_at > _utcnow() - timedelta(seconds=ttl),
+    )
+
+
+class PresencePublisher:
+    """Mirrors this process's online chat members into chat_presence.
+
+    Each tick writes only the (chat, user) pairs that came or went since the
+    last one. Rows are re-stamped every third of ``ttl``; a process that dies
+    leaves rows that stop counting after ``ttl`` and are pruned by the others.
+    """
+
+    def __init__(
+        self,
+        manager: "ConnectionManager",
+        instance: str,
+        interval: float,
+        ttl: float,
+    ) -> None:
+        self.manager = manager
+        self.instance = instance
+        self.interval = interval
+        self.ttl = ttl
+        # None until the first tick has replaced whatever an earlier run left.
+        self._published: set[_Key] | None = None
+        self._stamped_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    def _online(self) -> set[_Key]:
+        return {
+            (uuid.UUID(chat_id), user_id)
+            for chat_id, users in self.manager.online.items()
+            for user_id in users
+        }
+
+    async def publish_once(self) -> None:
+        current = self._online()
+        mine = ChatPresence.instance == self.instance
+        async with AsyncSessionLocal() as db:
+            if self._published is None:
+                await db.execute(delete(ChatPresence).where(mine))
+                published: set[_Key] = set()
+            else:
+                published = self._published
+            key = tuple_(ChatPresence.chat_id, ChatPresence.user_id)
+            for chunk in _chunks(published - current):
+                await db.execute(delete(ChatPresence).where(mine, key.in_(chunk)))
+            now = _utcnow()
+            dialect = db.get_bind().dialect.name
+            insert = pg_insert if dialect == "postgresql" else sqlite_insert
+            for chunk in _chunks(current - published):
+                stmt = insert(ChatPresence).values(
+                    [
+                        {
+                            "instance": self.instance,
+                            "chat_id": chat_id,
+                            "user_id": user_id,
+                            "seen_at": now,
+                        }
+                        for chat_id, user_id in chunk
+                    ]
+                )
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["instance", "chat_id", "user_id"],
+                        set_={"seen_at": stmt.excluded.seen_at},
+                    )
+                )
+            if time.monotonic() - self._stamped_at >= self.ttl / 3:
+                await db.execute(update(ChatPresence).where(mine).values(seen_at=now))
+                await db.execute(
+                    delete(ChatPresence).where(
+                        ChatPresence.seen_at < now - timedelta(seconds=self.ttl)
+                    )
+                )
+                self._stamped_at = time.monotonic()
+            await db.commit()
+        self._published = current
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    delete(ChatPresence).where(ChatPresence.instance == self.instance)
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to clear presence on shutdown")
+        self._published = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.publish_once()
+            except Exception:
+                logger.exception("Failed to publish presence")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,52 @@
+import time
+from collections.abc import Hashable
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1.0) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class RateLimiter:
+    """Token buckets keyed by anything hashable, e.g. (user_id, event)."""
+
+    def __init__(self, rate: float, burst: float, prune_every: int = 1024) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.prune_every = prune_every
+        self._buckets: dict[Hashable, TokenBucket] = {}
+        self._inserts = 0
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            self._inserts += 1
+            if self._inserts % self.prune_every == 0:
+                self.prune()
+        return bucket.take(cost)
+
+    def prune(self) -> None:
+        # A full bucket is indistinguishable from a fresh one, so it can go.
+        now = time.monotonic()
+        for key in [k for k, b in self._buckets.items() if b.is_full(now)]:
+            del self._buckets[key]
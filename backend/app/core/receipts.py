@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import uuid
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.ws_settings import ConnectionManager, manager
+from app.crud.chat import mark_read, touch_chats
+from app.db.session import AsyncSessionLocal
+from app.models.chat import Chat, ChatMembers, Message
+from app.schemas.chat import ChatType, MessageStatus
+
+logger = logging.getLogger(__name__)
+
+# Statuses a receipt is allowed to advance from; receipts never move backwards.
+_ADVANCES_FROM = {
+    MessageStatus.delivered: (MessageStatus.sent,),
+    MessageStatus.read: (MessageStatus.sent, MessageStatus.delivered),
+}
+
+ReceiptKey = tuple[str, uuid.UUID, MessageStatus]
+
+
+class ReceiptBuffer:
+    """Coalesces "acked up to seq N" receipts and flushes them as range UPDATEs.
+
+    Only the highest ack per (chat, user, status) survives until the next flush, so
+    a client acking every message costs one UPDATE per flush interval, not one per
+    message. Read receipts also advance the member's read pointer, which is all a
+    group records, since a shared message status would let its first reader mark
+    it read for everyone. Receipts go to the senders they cover, not the room.
+    """
+
+    def __init__(self, manager: ConnectionManager, flush_interval: float) -> None:
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self._pending: dict[ReceiptKey, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def ack(
+        self,
+        chat_id: str,
+        user_id: uuid.UUID,
+        seq: int,
+        status: MessageStatus,
+    ) -> None:
+        if status not in _ADVANCES_FROM:
+            raise ValueError(f"Cannot acknowledge with status {status.value!r}")
+        key = (chat_id, user_id, status)
+        if seq > self._pending.get(key, 0):
+            self._pending[key] = seq
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        # (chat, users whose messages the receipts cover) -> updates
+        frames: dict[tuple[str, frozenset[uuid.UUID]], list[dict]] = {}
+        chats: dict[uuid.UUID, tuple[ChatType, int] | None] = {}
+        try:
+            async with AsyncSessionLocal() as db:
+                for (chat_id, user_id, status), seq in pending.items():
+                    chat_uuid = uuid.UUID(chat_id)
+                    if chat_uuid not in chats:
+                        chats[chat_uuid] = (
+                            await db.execute(
+                                select(Chat.type, Chat.last_seq).where(
+                                    Chat.chat_id == chat_uuid
+                                )
+                            )
+                        ).first()
+                    if chats[chat_uuid] is None:
+                        continue
+                    chat_type, last_seq = chats[chat_uuid]
+                    # Acks are client input: never cover messages sent after
+                    # the flush started.
+                    seq = min(seq, last_seq)
+                    if chat_type == ChatType.private:
+                        senders = await self._advance_status(
+                            db, chat_uuid, user_id, seq, status
+                        )
+                    elif status == MessageStatus.read:
+                        senders = await self._newly_read_senders(
+                            db, chat_uuid, user_id, seq
+                        )
+                    else:
+                        # Groups keep no per-member delivery state.
+                        continue
+                    if status == MessageStatus.read:
+                        await mark_read(
+                            db, chat_id=chat_uuid, user_id=user_id, up_to_seq=seq
+                        )
+                    if senders:
+                        frames.setdefault((chat_id, frozenset(senders)), []).append(
+                            {
+                                "user_id": str(user_id),
+                                "status": status.value,
+                                "up_to_seq": seq,
+                            }
+                        )
+                await db.commit()
+        except Exception:
+            # Keep anything a newer ack has not superseded for the next round.
+            for key, seq in pending.items():
+                if seq > self._pending.get(key, 0):
+                    self._pending[key] = seq
+            raise
+
+        # One frame per chat and audience, carrying every change for it.
+        for (chat_id, senders), updates in frames.items():
+            await self.manager.broadcast(
+                chat_id,
+                {"event": "receipts", "chat_id": chat_id, "updates": updates},
+                only_users=set(senders),
+            )
+
+    @staticmethod
+    async def _advance_status(
+        db, chat_id: uuid.UUID, user_id: uuid.UUID, seq: int, status: MessageStatus
+    ) -> set[uuid.UUID]:
+        # Private chats only: the one other member is the only reader, so the
+        # status on the message is theirs. Returns whose messages advanced.
+        result = await db.execute(
+            update(Message)
+            .where(
+                Message.chat_id == chat_id,
+                Message.sender_id != user_id,
+                Message.seq <= seq,
+                Message.status.in_(_ADVANCES_FROM[status]),
+            )
+            .values(status=status)
+            .returning(Message.sender_id)
+            .execution_options(synchronize_session=False)
+        )
+        senders = set(result.scalars())
+        if senders:
+            await touch_chats(db, [chat_id])
+        return senders
+
+    @staticmethod
+    async def _newly_read_senders(
+        db, chat_id: uuid.UUID, user_id: uuid.UUID, seq: int
+    ) -> set[uuid.UUID]:
+        # Groups: a read only moves the reader's own pointer (via mark_read),
+        # never the shared message status; it is reported to the senders of
+        # the messages it newly covers.
+        read_up_to = await db.scalar(
+            select(ChatMembers.last_read_seq).where(
+                ChatMembers.chat_id == chat_id, ChatMembers.user_id == user_id
+            )
+        )
+        if read_up_to is None or read_up_to >= seq:
+            return set()
+        return set(
+            await db.scalars(
+                select(Message.sender_id)
+                .where(
+                    Message.chat_id == chat_id,
+                    Message.sender_id != user_id,
+                    Message.seq > read_up_to,
+                    Message.seq <= seq,
+                )
+                .distinct()
+            )
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush message receipts")
+
+
+receipts = ReceiptBuffer(manager, flush_interval=settings.ws_receipt_flush_interval)
@@ -0,0 +1,180 @@
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.schemas.chat import Message as MessageSchema
+
+# Rough per-row cost beyond the encoded bytes: tuple, deque slot, datetime.
+_ROW_OVERHEAD = 120
+
+# (seq, expires_at, JSON of the history row)
+_Row = tuple[int, datetime | None, bytes]
+
+
+def encode_row(row: dict) -> bytes:
+    # Same shape and encoding as a message in the history response.
+    return MessageSchema.model_validate(row).model_dump_json().encode()
+
+
+class _Entry:
+    __slots__ = ("last_seq", "changed_at", "complete", "rows", "nbytes")
+
+    def __init__(self, last_seq: int, changed_at: datetime, complete: bool) -> None:
+        self.last_seq = last_seq
+        self.changed_at = changed_at
+        # Holds every live message of the chat, not just the newest ones.
+        self.complete = complete
+        self.rows: deque[_Row] = deque()
+        self.nbytes = 0
+
+    @property
+    def version(self) -> tuple[int, datetime]:
+        return self.last_seq, self.changed_at
+
+    def push(self, row: _Row, per_chat: int) -> None:
+        self.rows.append(row)
+        self.nbytes += len(row[2]) + _ROW_OVERHEAD
+        while len(self.rows) > per_chat:
+            dropped = self.rows.popleft()
+            self.nbytes -= len(dropped[2]) + _ROW_OVERHEAD
+            self.complete = False
+
+
+@dataclass
+class RecentStats:
+    hits: int = 0
+    misses: int = 0
+    appends: int = 0
+    evictions: int = 0
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "appends": self.appends,
+            "evictions": self.evictions,
+        }
+
+
+class RecentMessages:
+    """The newest rendered history rows of hot chats, as pre-encoded JSON.
+
+    Serves first-page history reads without the messages join. An entry is
+    only trusted while the chat's (last_seq, changed_at) still match what it
+    was built from: sends move last_seq and are appended by the outbox
+    consumer; anything else that changes how messages read bumps changed_at
+    and sends the next read back to the database to refill it. Cold chats are
+    evicted least recently used first once the byte budget is spent.
+    """
+
+    def __init__(self, per_chat: int, max_bytes: int) -> None:
+        self.per_chat = per_chat
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.stats = RecentStats()
+        self._chats: OrderedDict[uuid.UUID, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def page(
+        self, chat_id: uuid.UUID, last_seq: int, changed_at: datetime, limit: int
+    ) -> bytes | None:
+        """The newest `limit` live rows as a JSON array, or None on a miss."""
+        entry = self._chats.get(chat_id)
+        if entry is None or entry.version != (last_seq, changed_at):
+            self.stats.misses += 1
+            return None
+        # Expired rows drop out at read time, as not_expired() does in SQL.
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = [
+            data
+            for _, expires_at, data in entry.rows
+            if expires_at is None or expires_at > now
+        ][-limit:]
+        if len(rows) < limit and not entry.complete:
+            self.stats.misses += 1
+            return None
+        self._chats.move_to_end(chat_id)
+        self.stats.hits += 1
+        return b"[" + b",".join(rows) + b"]"
+
+    def fill(
+        self,
+        chat_id: uuid.UUID,
+        last_seq: int,
+        changed_at: datetime,
+        page: list[dict],
+        complete: bool,
+    ) -> None:
+        # `page` is an oldest-first first page, as the history route renders it.
+        if not page or page[-1]["seq"] is None:
+            return
+        entry = _Entry(max(last_seq, page[-1]["seq"]), changed_at, complete)
+        for row in page:
+            entry.push((row["seq"], row["expires_at"], encode_row(row)), self.per_chat)
+        self._replace(chat_id, entry)
+
+    def append(self, chat_id: uuid.UUID, message: dict) -> None:
+        # Fed by the outbox relay in sequence order; at-least-once, so repeats
+        # are skipped and a gap means the entry can no longer be trusted.
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            return
+        seq = message["seq"]
+        if seq <= entry.last_seq:
+            return
+        if seq != entry.last_seq + 1:
+            self._drop(chat_id)
+            return
+        row = {
+            **message,
+            "receiver_id": None,
+            "receiver_device_id": None,
+            "receiver_username": None,
+        }
+        data = encode_row(row)
+        expires_at = message["expires_at"]
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        before = entry.nbytes
+        entry.push((seq, expires_at, data), self.per_chat)
+        entry.last_seq = seq
+        self.nbytes += entry.nbytes - before
+        self.stats.appends += 1
+        self._evict()
+
+    def _replace(self, chat_id: uuid.UUID, entry: _Entry) -> None:
+        self._drop(chat_id)
+        self._chats[chat_id] = entry
+        self.nbytes += entry.nbytes
+        self._evict()
+
+    def _drop(self, chat_id: uuid.UUID) -> None:
+        entry = self._chats.pop(chat_id, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+
+    def _evict(self) -> None:
+        while self.nbytes > self.max_bytes and self._chats:
+            _, entry = self._chats.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.stats.evictions += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "chats": len(self._chats),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            **self.stats.snapshot(),
+        }
+
+
+recent_messages = RecentMessages(
+    per_chat=settings.recent_messages_per_chat,
+    max_bytes=settings.recent_messages_max_bytes,
+)
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+import uuid
+
+from app.core.ws_settings import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class TypingTracker:
+    """Server-side typing state per (chat, user), fanned out once per tick.
+
+    Keystroke frames only refresh an expiry deadline; a room is rebroadcast only
+    when its set of typing users changed, and at most once per tick, as a single
+    aggregated frame.
+    """
+
+    def __init__(
+        self, manager: ConnectionManager, tick_interval: float, ttl: float
+    ) -> None:
+        self.manager = manager
+        self.tick_interval = tick_interval
+        self.ttl = ttl
+        self._typing: dict[str, dict[uuid.UUID, float]] = {}
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task | None = None
+
+    def set_typing(self, chat_id: str, user_id: uuid.UUID, typing: bool) -> None:
+        room = self._typing.setdefault(chat_id, {})
+        if typing:
+            if user_id not in room:
+                self._dirty.add(chat_id)
+            room[user_id] = time.monotonic() + self.ttl
+        elif room.pop(user_id, None) is not None:
+            self._dirty.add(chat_id)
+
+        if not room:
+            del self._typing[chat_id]
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for chat_id in list(self._typing):
+            room = self._typing[chat_id]
+            expired = [uid for uid, deadline in room.items() if deadline <= now]
+            for uid in expired:
+                del room[uid]
+            if expired:
+                self._dirty.add(chat_id)
+            if not room:
+                del self._typing[chat_id]
+
+    async def tick(self) -> None:
+        self._expire()
+        dirty, self._dirty = self._dirty, set()
+        for chat_id in dirty:
+            user_ids = [str(uid) for uid in self._typing.get(chat_id, ())]
+            await self.manager.broadcast(
+                chat_id, {"event": "typing", "chat_id": chat_id, "user_ids": user_ids}
+            )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Failed to broadcast typing indicators")
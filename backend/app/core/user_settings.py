@@ -34,14 +34,13 @@ async def validate_session_logic(payload: dict, db: AsyncSession):
     if expires_at < now_utc or session_record.user_id != user_id:
         return None
 
-    # return (user, session_record)
-    return user
+    return (user, session_record)
 
 
-async def get_current_user(
+async def get_current_auth(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[AsyncSession, Depends(get_db)],
-):
+) -> tuple[User, Session]:
     payload = verify_access_token(token)
     if payload is None:
         raise HTTPException(
@@ -60,6 +59,13 @@ async def get_current_user(
     return result
 
 
+async def get_current_user(
+    auth: Annotated[tuple[User, Session], Depends(get_current_auth)],
+) -> User:
+    user, _ = auth
+    return user
+
+
 async def get_current_user_ws(
     websocket: WebSocket,
     db: AsyncSession = Depends(get_db),
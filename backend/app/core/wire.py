@@ -0,0 +1,90 @@
+import json
+from typing import Any
+
+from pydantic import TypeAdapter
+
+from app.schemas.ws import ClientFrame
+
+try:
+    import msgpack
+except ImportError:  # optional: `pip install ghost-chat[msgpack]`
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = "ghost.msgpack.v1"
+
+# Compact keys used by the binary protocol, in both directions.
+_LONG_TO_SHORT = {
+    "event": "e",
+    "payload": "p",
+    "error": "er",
+    "message_id": "mi",
+    "chat_id": "c",
+    "sender_id": "s",
+    "sender_username": "su",
+    "sender_device_id": "sd",
+    "seq": "q",
+    "client_msg_id": "cm",
+    "created_at": "ca",
+    "updated_at": "ua",
+    "expires_at": "ex",
+    "ttl_seconds": "tt",
+    "status": "st",
+    "receiver_id": "ri",
+    "receiver_device_id": "rd",
+    "receiver_username": "ru",
+    "user_id": "u",
+    "user_ids": "us",
+    "updates": "up",
+    "up_to_seq": "uq",
+    "state": "sa",
+}
+_SHORT_TO_LONG = {short: long for long, short in _LONG_TO_SHORT.items()}
+
+# Built once at import; validating through it skips per-frame schema setup.
+_client_frame = TypeAdapter(ClientFrame)
+
+
+def _rename(obj: Any, keys: dict[str, str]) -> Any:
+    if isinstance(obj, dict):
+        return {keys.get(k, k): _rename(v, keys) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_rename(v, keys) for v in obj]
+    return obj
+
+
+class JsonCodec:
+    subprotocol: str | None = None
+
+    def encode(self, frame: dict) -> str:
+        return json.dumps(frame, separators=(",", ":"))
+
+    def decode(self, data: str | bytes) -> ClientFrame:
+        return _client_frame.validate_json(data)
+
+
+class MsgpackCodec:
+    subprotocol: str | None = MSGPACK_SUBPROTOCOL
+
+    def encode(self, frame: dict) -> bytes:
+        return msgpack.packb(_rename(frame, _LONG_TO_SHORT))
+
+    def decode(self, data: str | bytes) -> ClientFrame:
+        if isinstance(data, str):
+            raise ValueError("Binary frames are required for this subprotocol")
+        try:
+            obj = msgpack.unpackb(data)
+        except Exception as e:
+            raise ValueError("Malformed msgpack frame") from e
+        return _client_frame.validate_python(_rename(obj, _SHORT_TO_LONG))
+
+
+Codec = JsonCodec | MsgpackCodec
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec() if msgpack is not None else None
+
+
+def negotiate(offered: list[str]) -> Codec:
+    if MSGPACK is not None and MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK
+    return JSON
@@ -1,27 +1,173 @@
-from fastapi import WebSocket
+import asyncio
+import uuid
+from collections import Counter
+
+from fastapi import WebSocket, status
 from typing import Dict, List
 
+from app.core.config import settings
+from app.core.fanout import FanoutPool
+from app.core.wire import JSON, Codec
+
 
 class ConnectionManager:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        fanout: FanoutPool | None = None,
+        fanout_threshold: int = 0,
+        send_timeout: float = 10.0,
+    ) -> None:
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.codecs: Dict[WebSocket, Codec] = {}
+        self.users: Dict[WebSocket, uuid.UUID] = {}
+        self.devices: Dict[WebSocket, uuid.UUID] = {}
+        # Open sockets per user per chat, for telling online members apart.
+        self.online: Dict[str, Counter[uuid.UUID]] = {}
+        self.fanout = fanout
+        # Rooms with at least this many sockets broadcast through the pool.
+        self.fanout_threshold = fanout_threshold
+        self.send_timeout = send_timeout
+        self._closing: set[asyncio.Task] = set()
 
-    async def connect(self, chat_id: str, websocket: WebSocket):
-        await websocket.accept()
+    async def connect(
+        self,
+        chat_id: str,
+        websocket: WebSocket,
+        codec: Codec = JSON,
+        user_id: uuid.UUID | None = None,
+        device_id: uuid.UUID | None = None,
+    ):
+        await websocket.accept(subprotocol=codec.subprotocol)
+        self.codecs[websocket] = codec
         if chat_id not in self.active_connections:
             self.active_connections[chat_id] = []
         self.active_connections[chat_id].append(websocket)
+        if device_id is not None:
+            self.devices[websocket] = device_id
+        if user_id is not None:
+            self.users[websocket] = user_id
+            self.online.setdefault(chat_id, Counter())[user_id] += 1
 
     def disconnect(self, chat_id: str, websocket: WebSocket):
-        if chat_id in self.active_connections:
-            self.active_connections[chat_id].remove(websocket)
-            if not self.active_connections[chat_id]:
+        self.codecs.pop(websocket, None)
+        self.devices.pop(websocket, None)
+        connections = self.active_connections.get(chat_id)
+        if connections and websocket in connections:
+            connections.remove(websocket)
+            if not connections:
                 del self.active_connections[chat_id]
+            user_id = self.users.pop(websocket, None)
+            if user_id is not None:
+                online = self.online[chat_id]
+                online[user_id] -= 1
+                if online[user_id] <= 0:
+                    del online[user_id]
+                if not online:
+                    del self.online[chat_id]
+
+    def online_users(self, chat_id: str) -> set[uuid.UUID]:
+        return set(self.online.get(chat_id, ()))
+
+    def is_online(self, chat_id: str, user_id: uuid.UUID) -> bool:
+        return user_id in self.online.get(chat_id, ())
+
+    async def _send_encoded(self, websocket: WebSocket, data: str | bytes):
+        if isinstance(data, bytes):
+            await websocket.send_bytes(data)
+        else:
+            await websocket.send_text(data)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        codec = self.codecs.get(websocket, JSON)
+        await self._send_encoded(websocket, codec.encode(message))
+
+    async def _send_or_drop(
+        self, chat_id: str, websocket: WebSocket, data: str | bytes
+    ):
+        try:
+            async with asyncio.timeout(self.send_timeout):
+                await self._send_encoded(websocket, data)
+        except Exception:
+            self.disconnect(chat_id, websocket)
+
+    def _fan_out(self, chat_id: str, message: dict, connections: List[WebSocket]):
+        encoded: Dict[str | None, str | bytes] = {}
+        for connection in connections:
+            codec = self.codecs.get(connection, JSON)
+            if codec.subprotocol not in encoded:
+                encoded[codec.subprotocol] = codec.encode(message)
+
+        async def send(websocket: WebSocket):
+            # Sockets that closed while queued have no codec left.
+            codec = self.codecs.get(websocket)
+            if codec is not None:
+                await self._send_or_drop(
+                    chat_id, websocket, encoded[codec.subprotocol]
+                )
+
+        # Sockets whose shard is too far behind would only fall further back:
+        # they are closed, and the client reconnects and catches up by sync.
+        for websocket in self.fanout.submit(connections, send):
+            self.disconnect(chat_id, websocket)
+            task = asyncio.create_task(self._close_slow(websocket))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _close_slow(self, websocket: WebSocket):
+        try:
+            async with asyncio.timeout(self.send_timeout):
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception:
+            pass
 
     async def broadcast(
-        self, chat_id: str, message: dict, exclude: WebSocket | None = None
+        self,
+        chat_id: str,
+        message: dict,
+        exclude: WebSocket | None = None,
+        exclude_device: uuid.UUID | None = None,
+        only_users: set[uuid.UUID] | None = None,
     ):
         if chat_id in self.active_connections:
-            for connection in self.active_connections[chat_id]:
+            connections = self.active_connections[chat_id]
+            if exclude_device is not None:
+                connections = [
+                    c for c in connections if self.devices.get(c) != exclude_device
+                ]
+            if only_users is not None:
+                connections = [
+                    c for c in connections if self.users.get(c) in only_users
+                ]
+            if (
+                self.fanout is not None
+                and self.fanout.running
+                and len(connections) >= self.fanout_threshold
+            ):
+                # Large room: queued on the shard workers, returns immediately.
+                self._fan_out(
+                    chat_id, message, [c for c in connections if c != exclude]
+                )
+                return
+            # Encode once per protocol in use, not once per recipient.
+            encoded: Dict[str | None, str | bytes] = {}
+            for connection in list(connections):
                 if connection != exclude:
-                    await connection.send_json(message)
+                    codec = self.codecs.get(connection, JSON)
+                    data = encoded.get(codec.subprotocol)
+                    if data is None:
+                        data = encoded[codec.subprotocol] = codec.encode(message)
+                    try:
+                        await self._send_encoded(connection, data)
+                    except Exception:
+                        # Dead socket: stop paying for it on every broadcast.
+                        self.disconnect(chat_id, connection)
+
+
+fanout_pool = FanoutPool(
+    workers=settings.ws_fanout_workers, queue_size=settings.ws_fanout_queue_size
+)
+manager = ConnectionManager(
+    fanout=fanout_pool,
+    fanout_threshold=settings.ws_fanout_threshold,
+    send_timeout=settings.ws_send_timeout,
+)
@@ -1,26 +1,229 @@
 from __future__ import annotations
 
-from app.models.chat import Message, ChatMembers, ChatMembersRole
+from app.models.chat import Message, ChatMembers, ChatMembersRole, Chat as ChatModel
+from app.models.outbox import OutboxEvent
 from app.models.user import User
 from app.schemas.chat import (
     Message as MessageSchema,
     MessageStatus,
     Chat,
+    ChatMember,
     ChatType,
+    ChatUnread,
+    MessageIn,
+    SearchHit,
 )
-from sqlalchemy import func, select, case
+from app.core.config import settings
+from app.core.dedup import recent_sends
+from app.db.search import TS_CONFIG
+from app.services.archive import ArchiveKey, archive, record_key
+from sqlalchemy import (
+    case,
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    table,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+import asyncio
+import re
 import uuid
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from typing import cast
 
 
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _message_out(msg: Message, sender_username: str) -> MessageSchema:
+    return MessageSchema(
+        message_id=str(msg.message_id),
+        chat_id=str(msg.chat_id),
+        sender_id=str(msg.sender_id),
+        sender_username=sender_username,
+        sender_device_id=str(msg.sender_device_id),
+        seq=msg.seq,
+        client_msg_id=msg.client_msg_id,
+        payload=msg.payload,
+        created_at=msg.created_at,
+        updated_at=msg.updated_at,
+        expires_at=msg.expires_at,
+        status=msg.status,
+    )
+
+
+# Slack for clock skew between whoever minted an id and whoever stamped created_at.
+_ID_TIME_SLACK = timedelta(minutes=5)
+
+
+def message_id_time(message_id: uuid.UUID) -> datetime | None:
+    # v7 ids lead with a millisecond Unix timestamp; older v4 ids carry none.
+    if message_id.version != 7:
+        return None
+    return datetime(1970, 1, 1) + timedelta(milliseconds=message_id.int >> 80)
+
+
+def created_before_id(message_id: uuid.UUID):
+    # A literal upper bound on created_at lets Postgres prune newer partitions
+    # at plan time; rows are never stamped later than the id minted for them.
+    minted_at = message_id_time(message_id)
+    if minted_at is None:
+        return None
+    return Message.created_at <= minted_at + _ID_TIME_SLACK
+
+
+def not_expired(now: datetime | None = None):
+    # Read-time half of expiry: rows past expires_at vanish before the purger runs.
+    if now is None:
+        now = _naive_utc(datetime.now(timezone.utc))
+    return or_(Message.expires_at.is_(None), Message.expires_at > now)
+
+
+def next_expiry(now: datetime | None = None):
+    # Earliest expiry still ahead in the outer query's chat, from its index.
+    if now is None:
+        now = _naive_utc(datetime.now(timezone.utc))
+    return (
+        select(func.min(Message.expires_at))
+        .where(Message.chat_id == ChatModel.chat_id, Message.expires_at > now)
+        .correlate(ChatModel)
+        .scalar_subquery()
+    )
+
+
+def message_expiry(
+    created_at: datetime, chat_ttl: int | None, message_ttl: int | None
+) -> datetime | None:
+    # The chat TTL is a ceiling; a message may only ask to disappear sooner.
+    ttls = [ttl for ttl in (chat_ttl, message_ttl) if ttl]
+    if not ttls:
+        return None
+    return created_at + timedelta(seconds=min(ttls))
+
+
+async def next_message_seq(
+    db: AsyncSession, chat_id: uuid.UUID, count: int = 1
+) -> tuple[int, int | None]:
+    # Row-locks the chat until commit, so sequence numbers are gap-free per chat.
+    # The chat's TTL rides along so sends need no extra round trip for it.
+    # Sends are told apart by last_seq, so changed_at is held still.
+    result = await db.execute(
+        update(ChatModel)
+        .where(ChatModel.chat_id == chat_id)
+        .values(last_seq=ChatModel.last_seq + count, changed_at=ChatModel.changed_at)
+        .returning(ChatModel.last_seq, ChatModel.message_ttl_seconds)
+    )
+    last_seq, ttl = result.one()
+    return last_seq, ttl
+
+
+async def touch_chats(db: AsyncSession, chat_ids) -> None:
+    # chat_ids may be a list or a select; see Chat.changed_at.
+    await db.execute(
+        update(ChatModel)
+        .where(ChatModel.chat_id.in_(chat_ids))
+        .values(changed_at=_naive_utc(datetime.now(timezone.utc)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def advance_expired_seq(db: AsyncSession, chat_ids) -> None:
+    # Called after purging: every seq below the oldest row still stored has
+    # expired, or been archived, which is old enough to stop counting as well.
+    oldest = (
+        select(func.min(Message.seq) - 1)
+        .where(Message.chat_id == ChatModel.chat_id)
+        .correlate(ChatModel)
+        .scalar_subquery()
+    )
+    watermark = func.coalesce(oldest, ChatModel.last_seq)
+    await db.execute(
+        update(ChatModel)
+        .where(ChatModel.chat_id.in_(chat_ids), ChatModel.expired_seq < watermark)
+        .values(expired_seq=watermark)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def mark_read(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    user_id: uuid.UUID,
+    up_to_seq: int,
+) -> bool:
+    # True if the pointer moved; acks past the newest message are refused.
+    last_seq = (
+        select(ChatModel.last_seq)
+        .where(ChatModel.chat_id == chat_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(ChatMembers)
+        .where(
+            ChatMembers.chat_id == chat_id,
+            ChatMembers.user_id == user_id,
+            ChatMembers.last_read_seq < up_to_seq,
+            last_seq >= up_to_seq,
+        )
+        .values(
+            last_read_seq=up_to_seq,
+            last_read_at=_naive_utc(datetime.now(timezone.utc)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+async def get_unread_counts(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    chat_id: uuid.UUID | None = None,
+) -> list[ChatUnread]:
+    # Pure pointer arithmetic off the user's memberships; never touches messages.
+    # Messages up to the chat's expired_seq are gone, so they never count.
+    read_up_to = case(
+        (ChatModel.expired_seq > ChatMembers.last_read_seq, ChatModel.expired_seq),
+        else_=ChatMembers.last_read_seq,
+    )
+    stmt = (
+        select(
+            ChatMembers.chat_id,
+            ChatModel.last_seq,
+            ChatMembers.last_read_seq,
+            (ChatModel.last_seq - read_up_to).label("unread"),
+        )
+        .join(ChatModel, ChatModel.chat_id == ChatMembers.chat_id)
+        .where(ChatMembers.user_id == user_id)
+    )
+    if chat_id is not None:
+        stmt = stmt.where(ChatMembers.chat_id == chat_id)
+    result = await db.execute(stmt)
+    return [ChatUnread.model_validate(row) for row in result.all()]
+
+
 async def get_messages(db: AsyncSession, chat_id: uuid.UUID, limit: int):
     msg_stmt = (
         select(Message, User.display_username)
         .join(User, User.user_id == Message.sender_id)
-        .where(Message.chat_id == chat_id)
+        .where(Message.chat_id == chat_id, not_expired())
         .order_by(Message.created_at.desc())
         .limit(limit)
     )
@@ -54,6 +257,7 @@ async def get_messages(db: AsyncSession, chat_id: uuid.UUID, limit: int):
                 payload=msg.payload,
                 created_at=msg.created_at,
                 updated_at=msg.updated_at,
+                expires_at=msg.expires_at,
                 status=msg.status,
                 receiver_username=receiver_usernames,
             )
@@ -62,6 +266,258 @@ async def get_messages(db: AsyncSession, chat_id: uuid.UUID, limit: int):
     return messages_list
 
 
+def archive_record(msg: Message) -> dict:
+    # chat_id is implied by the segment's directory; usernames are joined on read.
+    return {
+        "message_id": str(msg.message_id),
+        "sender_id": str(msg.sender_id),
+        "sender_device_id": str(msg.sender_device_id),
+        "seq": msg.seq,
+        "client_msg_id": msg.client_msg_id,
+        "payload": msg.payload,
+        "created_at": msg.created_at.isoformat(),
+        "updated_at": msg.updated_at.isoformat() if msg.updated_at else None,
+        "status": msg.status.value,
+    }
+
+
+async def resolve_history_cursor(
+    db: AsyncSession, chat_id: uuid.UUID, message_id: uuid.UUID
+) -> ArchiveKey | None:
+    stmt = select(Message.created_at).where(
+        Message.chat_id == chat_id, Message.message_id == message_id
+    )
+    bound = created_before_id(message_id)
+    if bound is not None:
+        stmt = stmt.where(bound)
+    created_at = await db.scalar(stmt)
+    if created_at is not None:
+        return created_at, message_id
+    record = await asyncio.to_thread(
+        archive.find, chat_id, message_id, message_id_time(message_id)
+    )
+    return record_key(record) if record else None
+
+
+def _history_key(row: dict) -> ArchiveKey:
+    return row["created_at"], uuid.UUID(row["message_id"])
+
+
+async def merge_archived(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    hot: list[dict],
+    before: ArchiveKey | None,
+    limit: int | None,
+) -> list[dict]:
+    # `hot` is an oldest-first page from messages; archived rows older than
+    # `before` are folded in only when they could belong on it. Segment reads
+    # touch disk and zlib, so they run off the event loop.
+    newest = await asyncio.to_thread(archive.newest_key, chat_id)
+    if newest is None:
+        return hot
+    if limit is None:
+        cold = await asyncio.to_thread(archive.read_all, chat_id)
+        if before is not None:
+            cold = [r for r in cold if record_key(r) < before]
+    elif len(hot) == limit and newest < _history_key(hot[0]):
+        return hot
+    else:
+        cold = await asyncio.to_thread(archive.read_before, chat_id, before, limit)
+    if not cold:
+        return hot
+
+    sender_ids = {uuid.UUID(r["sender_id"]) for r in cold}
+    result = await db.execute(
+        select(User.user_id, User.display_username).where(
+            User.user_id.in_(sender_ids)
+        )
+    )
+    usernames = {str(uid): name for uid, name in result.all()}
+
+    # A crash between writing a segment and deleting its rows leaves both copies.
+    seen = {row["message_id"] for row in hot}
+    merged = hot + [
+        {
+            **record,
+            "chat_id": str(chat_id),
+            "sender_username": usernames.get(record["sender_id"], ""),
+            "created_at": datetime.fromisoformat(record["created_at"]),
+            "updated_at": (
+                datetime.fromisoformat(record["updated_at"])
+                if record["updated_at"]
+                else None
+            ),
+            "expires_at": None,
+            "receiver_id": None,
+            "receiver_device_id": None,
+            "receiver_username": None,
+        }
+        for record in cold
+        if record["message_id"] not in seen
+    ]
+    merged.sort(key=_history_key)
+    return merged if limit is None else merged[-limit:]
+
+
+async def get_changes_since(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    since: datetime | None,
+    after_id: uuid.UUID | None,
+    limit: int,
+) -> tuple[list[MessageSchema], tuple[datetime, uuid.UUID] | None, bool]:
+    # Keyset over (changed_at, message_id) across all of the user's chats, read
+    # per chat off ix_messages_chat_changed so other chats' changes are never
+    # scanned.
+    # Rows newer than the horizon wait for the next poll, so one committed late
+    # with an earlier changed_at still lands ahead of the watermark.
+    horizon = _naive_utc(
+        datetime.now(timezone.utc) - timedelta(seconds=settings.sync_grace_seconds)
+    )
+    due = [Message.changed_at <= horizon, not_expired()]
+    if since is not None:
+        # Without an id every row at `since` is still due, ties included.
+        due.append(
+            tuple_(Message.changed_at, Message.message_id)
+            > (_naive_utc(since), after_id or uuid.UUID(int=0))
+        )
+    by_change = (Message.changed_at.asc(), Message.message_id.asc())
+
+    if db.get_bind().dialect.name == "postgresql":
+        # One index range per chat, each stopped after a page's worth, so even a
+        # first sync never reads more than chats * (limit + 1) rows.
+        # The deferred search vector is left out; the row never loads it.
+        columns = [c for c in Message.__table__.c if c.key != "search_vector"]
+        per_chat = (
+            select(*columns)
+            .where(Message.chat_id == ChatMembers.chat_id, *due)
+            .order_by(*by_change)
+            .limit(limit + 1)
+            .lateral()
+        )
+        msg = aliased(Message, per_chat)
+        stmt = (
+            select(msg, User.display_username)
+            .select_from(ChatMembers)
+            .join(per_chat, true())
+            .join(User, User.user_id == msg.sender_id)
+            .where(ChatMembers.user_id == user_id)
+            .order_by(msg.changed_at.asc(), msg.message_id.asc())
+        )
+    else:
+        member_chats = select(ChatMembers.chat_id).where(
+            ChatMembers.user_id == user_id
+        )
+        stmt = (
+            select(Message, User.display_username)
+            .join(User, User.user_id == Message.sender_id)
+            .where(Message.chat_id.in_(member_chats), *due)
+            .order_by(*by_change)
+        )
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = result.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    watermark = (rows[-1][0].changed_at, rows[-1][0].message_id) if rows else None
+    return [_message_out(msg, uname) for msg, uname in rows], watermark, has_more
+
+
+_messages_fts = table(
+    "messages_fts", column("rank"), column("payload"), column("message_id")
+)
+_HEADLINE_OPTIONS = (
+    "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MinWords=5, MaxWords=20"
+)
+
+
+def _fts5_query(query: str) -> str:
+    # Every term becomes a quoted FTS5 string, so user input is never syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def _mark_terms(payload: str, query: str, width: int = 200) -> str:
+    # A ts_headline-like excerpt: the text around the first match, every
+    # query term marked. Operators of the websearch syntax are not terms.
+    terms = [
+        re.escape(term.strip('"').lstrip("-"))
+        for term in query.split()
+        if term.strip('"').lstrip("-") and term.lower() != "or"
+    ]
+    if not terms:
+        return payload[:width]
+    pattern = re.compile("|".join(terms), re.IGNORECASE)
+    first = pattern.search(payload)
+    start = max(0, first.start() - width // 4) if first else 0
+    end = start + width
+    excerpt = pattern.sub(lambda m: f"<mark>{m.group(0)}</mark>", payload[start:end])
+    return ("…" if start else "") + excerpt + ("…" if end < len(payload) else "")
+
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    query: str,
+    chat_id: uuid.UUID | None,
+    after: tuple[float, uuid.UUID] | None,
+    limit: int,
+) -> tuple[list[SearchHit], tuple[float, uuid.UUID] | None, bool]:
+    # Keyset over (score, message_id) where a lower score is a better match.
+    if db.get_bind().dialect.name == "postgresql":
+        vector = literal_column("messages.search_vector")
+        tsquery = func.websearch_to_tsquery(TS_CONFIG, query)
+        score = -func.ts_rank(vector, tsquery)
+        # ts_headline only sees the stored text; compressed rows get theirs
+        # from _mark_terms once decoded.
+        stored = literal_column("messages.payload")
+        highlight = case(
+            (func.left(stored, 1) == func.chr(27), None),
+            else_=func.ts_headline(TS_CONFIG, stored, tsquery, _HEADLINE_OPTIONS),
+        )
+        stmt = select(Message, User.display_username, score, highlight).where(
+            vector.op("@@")(tsquery)
+        )
+    else:
+        score = _messages_fts.c.rank
+        highlight = func.snippet(
+            literal_column("messages_fts"), 0, "<mark>", "</mark>", "…", 16
+        )
+        stmt = (
+            select(Message, User.display_username, score, highlight)
+            .select_from(_messages_fts)
+            .join(Message, Message.message_id == _messages_fts.c.message_id)
+            .where(literal_column("messages_fts").op("MATCH")(_fts5_query(query)))
+        )
+
+    stmt = stmt.join(User, User.user_id == Message.sender_id).where(
+        Message.chat_id.in_(
+            select(ChatMembers.chat_id).where(ChatMembers.user_id == user_id)
+        ),
+        not_expired(),
+    )
+    if chat_id is not None:
+        stmt = stmt.where(Message.chat_id == chat_id)
+    if after is not None:
+        stmt = stmt.where(tuple_(score, Message.message_id) > tuple_(*after))
+
+    stmt = stmt.order_by(score, Message.message_id).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    hits = [
+        SearchHit(
+            message=_message_out(msg, uname),
+            rank=-row_score,
+            highlight=text if text is not None else _mark_terms(msg.payload, query),
+        )
+        for msg, uname, row_score, text in rows
+    ]
+    next_key = (rows[-1][2], rows[-1][0].message_id) if rows else None
+    return hits, next_key, has_more
+
+
 async def get_or_create_private_chat(
     db: AsyncSession,
     user1_id: uuid.UUID,
@@ -105,6 +561,24 @@ async def get_or_create_private_chat(
     return chat_id
 
 
+async def _receivers(
+    db: AsyncSession, chat_id: uuid.UUID, sender_id: uuid.UUID
+) -> tuple[list[str] | None, list[str] | None]:
+    # Large rooms get no receiver lists; one row past the limit tells us which.
+    receivers_max = settings.message_receivers_max
+    result = await db.execute(
+        select(User.user_id, User.display_username)
+        .join(ChatMembers, ChatMembers.user_id == User.user_id)
+        .where(ChatMembers.chat_id == chat_id, ChatMembers.user_id != sender_id)
+        .limit(receivers_max + 1)
+    )
+    receivers = result.all()
+    if len(receivers) > receivers_max:
+        return None, None
+    usernames = [username for _, username in receivers]
+    return usernames, [str(uid) for uid, _ in receivers]
+
+
 async def add_message(
     db: AsyncSession,
     chat_id: uuid.UUID,
@@ -113,31 +587,32 @@ async def add_message(
     payload: str,
     updated_at: datetime | None = None,
     status: MessageStatus = MessageStatus.sent,
+    client_msg_id: str | None = None,
+    ttl_seconds: int | None = None,
 ) -> MessageSchema:
+    seq, chat_ttl = await next_message_seq(db, chat_id)
+    created_at = _naive_utc(datetime.now(timezone.utc))
     msg = Message(
         chat_id=chat_id,
         sender_id=sender_id,
         sender_device_id=sender_device_id,
+        seq=seq,
+        client_msg_id=client_msg_id,
         payload=payload,
+        created_at=created_at,
         updated_at=updated_at,
+        expires_at=message_expiry(created_at, chat_ttl, ttl_seconds),
         status=status,
     )
     db.add(msg)
+    await mark_read(db, chat_id=chat_id, user_id=sender_id, up_to_seq=seq)
     await db.flush()
 
     sender_result = await db.execute(
         select(User.display_username).where(User.user_id == sender_id)
     )
     sender_username = sender_result.scalar_one()
-
-    members_result = await db.execute(
-        select(User.user_id, User.display_username)
-        .join(ChatMembers, ChatMembers.user_id == User.user_id)
-        .where(ChatMembers.chat_id == chat_id)
-    )
-    all_members = members_result.all()
-    receiver_usernames = [username for uid, username in all_members if uid != sender_id]
-    receiver_ids = [str(uid) for uid, _ in all_members if uid != sender_id]
+    receiver_usernames, receiver_ids = await _receivers(db, chat_id, sender_id)
 
     message_schema = MessageSchema(
         message_id=str(msg.message_id),
@@ -145,18 +620,115 @@ async def add_message(
         sender_id=str(sender_id),
         sender_username=sender_username,
         sender_device_id=str(sender_device_id),
+        seq=msg.seq,
+        client_msg_id=msg.client_msg_id,
         payload=msg.payload,
         created_at=msg.created_at,
         updated_at=msg.updated_at,
+        expires_at=msg.expires_at,
         status=msg.status,
         receiver_username=receiver_usernames,
         receiver_id=receiver_ids,
         receiver_device_id=None,
     )
+    # Committed with the message; the outbox relay fans it out from there.
+    db.add(
+        OutboxEvent(
+            kind="message",
+            chat_id=chat_id,
+            payload=message_schema.model_dump_json(),
+        )
+    )
 
     return message_schema
 
 
+async def find_sent_message(
+    db: AsyncSession,
+    sender_device_id: uuid.UUID,
+    client_msg_id: str,
+) -> MessageSchema | None:
+    result = await db.execute(
+        select(Message, User.display_username)
+        .join(User, User.user_id == Message.sender_id)
+        .where(
+            Message.sender_device_id == sender_device_id,
+            Message.client_msg_id == client_msg_id,
+        )
+    )
+    row = result.first()
+    return _message_out(*row) if row else None
+
+
+class ClientMsgIdConflict(Exception):
+    """A device reused a client_msg_id for a different chat than the original."""
+
+
+def _retry_of(
+    original: MessageSchema, chat_id: uuid.UUID
+) -> tuple[MessageSchema, bool]:
+    # Keys are unique per device, not per chat, so a match elsewhere is a
+    # client bug rather than a retry; acking it would drop the new text.
+    if original.chat_id != str(chat_id):
+        raise ClientMsgIdConflict(original.client_msg_id)
+    return original, False
+
+
+async def add_message_once(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    sender_id: uuid.UUID,
+    sender_device_id: uuid.UUID,
+    payload: str,
+    client_msg_id: str | None = None,
+    ttl_seconds: int | None = None,
+) -> tuple[MessageSchema, bool]:
+    # A retried client_msg_id returns the original message and False.
+    if client_msg_id is None:
+        message = await add_message(
+            db,
+            chat_id=chat_id,
+            sender_id=sender_id,
+            sender_device_id=sender_device_id,
+            payload=payload,
+            ttl_seconds=ttl_seconds,
+        )
+        return message, True
+
+    cached = recent_sends.get((sender_device_id, client_msg_id))
+    if cached is not None:
+        return _retry_of(cached, chat_id)
+
+    # Take the chat row lock that the send needs anyway before looking for the
+    # original, so a concurrent retry waits here and then finds it. Postgres has
+    # no global unique index on partitioned messages to catch it later.
+    await db.execute(
+        select(ChatModel.chat_id).where(ChatModel.chat_id == chat_id).with_for_update()
+    )
+    existing = await find_sent_message(db, sender_device_id, client_msg_id)
+    if existing is not None:
+        return _retry_of(existing, chat_id)
+
+    try:
+        async with db.begin_nested():
+            message = await add_message(
+                db,
+                chat_id=chat_id,
+                sender_id=sender_id,
+                sender_device_id=sender_device_id,
+                payload=payload,
+                client_msg_id=client_msg_id,
+                ttl_seconds=ttl_seconds,
+            )
+    except IntegrityError:
+        # A concurrent retry won the race on uq_message_device_client_msg.
+        existing = await find_sent_message(db, sender_device_id, client_msg_id)
+        if existing is None:
+            raise
+        return _retry_of(existing, chat_id)
+    return message, True
+
+
 async def is_chat_member(
     db: AsyncSession,
     chat_id: uuid.UUID,
@@ -171,3 +743,290 @@ async def is_chat_member(
     member = result.scalar_one_or_none()
 
     return member is not None
+
+
+# Rows per multi-row INSERT; keeps bind parameters well under driver limits.
+MEMBER_INSERT_BATCH = 1000
+
+
+def is_group_admin(chat_id: uuid.UUID, user_id: uuid.UUID):
+    # Aliased so it never correlates with a statement on chat_members itself.
+    actor = aliased(ChatMembers)
+    return exists().where(
+        ChatModel.chat_id == chat_id,
+        ChatModel.type == ChatType.group,
+        actor.chat_id == ChatModel.chat_id,
+        actor.user_id == user_id,
+        actor.role == ChatMembersRole.admin,
+    )
+
+
+async def add_chat_members(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    user_ids: list[uuid.UUID],
+    role: ChatMembersRole,
+) -> int:
+    """Insert memberships for existing users, skipping ones already present.
+
+    One INSERT ... SELECT per batch picks the users that exist and starts each
+    new member's read pointer at the chat's newest message, so history from
+    before they joined does not count as unread.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        insert, new_id = pg_insert, func.gen_random_uuid()
+    else:
+        # UUIDs are stored as 32 hex digits there.
+        insert, new_id = sqlite_insert, func.lower(func.hex(func.randomblob(16)))
+    added = 0
+    unique_ids = list(dict.fromkeys(user_ids))
+    for start in range(0, len(unique_ids), MEMBER_INSERT_BATCH):
+        chunk = unique_ids[start : start + MEMBER_INSERT_BATCH]
+        new_members = (
+            select(
+                new_id,
+                ChatModel.chat_id,
+                User.user_id,
+                literal(role, ChatMembers.role.type),
+                ChatModel.last_seq,
+            )
+            .select_from(ChatModel)
+            .join(User, User.user_id.in_(chunk))
+            .where(ChatModel.chat_id == chat_id)
+        )
+        result = await db.execute(
+            insert(ChatMembers)
+            .from_select(
+                ["id", "chat_id", "user_id", "role", "last_read_seq"], new_members
+            )
+            .on_conflict_do_nothing(index_elements=["chat_id", "user_id"])
+        )
+        added += result.rowcount
+    if added:
+        await touch_chats(db, [chat_id])
+    return added
+
+
+async def remove_chat_members(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    actor_id: uuid.UUID,
+    user_ids: list[uuid.UUID],
+) -> int:
+    """Delete memberships in one statement; non-admins may only remove themselves.
+
+    A group whose last admin leaves passes the role to its longest-standing
+    member rather than being left with nobody able to manage it.
+    """
+    # Serialises removals, so two admins removing each other cannot both pass
+    # the check below against a snapshot that still has the other.
+    await db.execute(
+        select(ChatModel.chat_id).where(ChatModel.chat_id == chat_id).with_for_update()
+    )
+    is_group = exists().where(
+        ChatModel.chat_id == chat_id, ChatModel.type == ChatType.group
+    )
+    result = await db.execute(
+        delete(ChatMembers)
+        .where(
+            ChatMembers.chat_id == chat_id,
+            ChatMembers.user_id.in_(user_ids),
+            is_group,
+            or_(ChatMembers.user_id == actor_id, is_group_admin(chat_id, actor_id)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        admin = aliased(ChatMembers)
+        heir = (
+            select(ChatMembers.id)
+            .where(ChatMembers.chat_id == chat_id)
+            .order_by(ChatMembers.joined_at, ChatMembers.user_id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(ChatMembers)
+            .where(
+                ChatMembers.id == heir,
+                ~exists().where(
+                    admin.chat_id == chat_id, admin.role == ChatMembersRole.admin
+                ),
+            )
+            .values(role=ChatMembersRole.admin)
+            .execution_options(synchronize_session=False)
+        )
+        await touch_chats(db, [chat_id])
+    return result.rowcount
+
+
+async def get_chat_members(
+    db: AsyncSession,
+    chat_id: uuid.UUID,
+    after: uuid.UUID | None,
+    limit: int,
+) -> list[ChatMember]:
+    stmt = (
+        select(
+            ChatMembers.user_id,
+            User.display_username,
+            ChatMembers.joined_at,
+            ChatMembers.role,
+        )
+        .join(User, User.user_id == ChatMembers.user_id)
+        .where(ChatMembers.chat_id == chat_id)
+        .order_by(ChatMembers.user_id)
+        .limit(limit)
+    )
+    if after is not None:
+        stmt = stmt.where(ChatMembers.user_id > after)
+    result = await db.execute(stmt)
+    return [
+        ChatMember(user_id=str(uid), username=username, joined_at=joined, role=role)
+        for uid, username, joined, role in result
+    ]
+
+
+async def add_messages(
+    db: AsyncSession,
+    sender_id: uuid.UUID,
+    sender_device_id: uuid.UUID,
+    items: list[MessageIn],
+) -> list[tuple[MessageSchema, bool]]:
+    """Send a batch of messages, possibly to several chats, in one transaction.
+
+    The caller checks membership. Each chat is locked and its sequence bumped
+    once for its whole share of the batch, and the new rows go in with one
+    multi-row INSERT. Results follow the input order; as with add_message_once,
+    a retried client_msg_id yields the original message and False, and one
+    reused for a different chat raises ClientMsgIdConflict.
+    """
+    results: list[tuple[MessageSchema, bool] | None] = [None] * len(items)
+    chat_ids = sorted({item.chat_id for item in items})
+    # Locked in a fixed order so two batches over the same chats cannot deadlock,
+    # and before the duplicate lookup for the reason given in add_message_once.
+    await db.execute(
+        select(ChatModel.chat_id)
+        .where(ChatModel.chat_id.in_(chat_ids))
+        .order_by(ChatModel.chat_id)
+        .with_for_update()
+    )
+
+    fresh: list[int] = []
+    # Repeats of a client_msg_id within the batch resolve to its first use.
+    first_use: dict[str, int] = {}
+    repeats: list[tuple[int, int]] = []
+    lookup: list[int] = []
+    for i, item in enumerate(items):
+        if item.client_msg_id is None:
+            fresh.append(i)
+            continue
+        cached = recent_sends.get((sender_device_id, item.client_msg_id))
+        if cached is not None:
+            results[i] = _retry_of(cached, item.chat_id)
+        else:
+            lookup.append(i)
+    if lookup:
+        found = await db.execute(
+            select(Message, User.display_username)
+            .join(User, User.user_id == Message.sender_id)
+            .where(
+                Message.sender_device_id == sender_device_id,
+                Message.client_msg_id.in_({items[i].client_msg_id for i in lookup}),
+            )
+        )
+        existing = {msg.client_msg_id: _message_out(msg, name) for msg, name in found}
+        for i in lookup:
+            key = cast(str, items[i].client_msg_id)
+            if key in existing:
+                results[i] = _retry_of(existing[key], items[i].chat_id)
+            elif key in first_use:
+                first = first_use[key]
+                if items[first].chat_id != items[i].chat_id:
+                    raise ClientMsgIdConflict(key)
+                repeats.append((i, first))
+            else:
+                first_use[key] = i
+                fresh.append(i)
+
+    if fresh:
+        # Sequence numbers within a chat follow the order of the batch.
+        fresh.sort()
+        sender_result = await db.execute(
+            select(User.display_username).where(User.user_id == sender_id)
+        )
+        sender_username = sender_result.scalar_one()
+        created_at = _naive_utc(datetime.now(timezone.utc))
+
+        counts = Counter(items[i].chat_id for i in fresh)
+        next_seq: dict[uuid.UUID, int] = {}
+        chat_ttls: dict[uuid.UUID, int | None] = {}
+        receivers: dict[uuid.UUID, tuple[list[str] | None, list[str] | None]] = {}
+        for chat_id in sorted(counts):
+            last_seq, chat_ttls[chat_id] = await next_message_seq(
+                db, chat_id, counts[chat_id]
+            )
+            next_seq[chat_id] = last_seq - counts[chat_id] + 1
+            await mark_read(db, chat_id=chat_id, user_id=sender_id, up_to_seq=last_seq)
+            receivers[chat_id] = await _receivers(db, chat_id, sender_id)
+
+        rows = []
+        for i in fresh:
+            item = items[i]
+            seq = next_seq[item.chat_id]
+            next_seq[item.chat_id] = seq + 1
+            row = {
+                "message_id": uuid.uuid7(),
+                "chat_id": item.chat_id,
+                "sender_id": sender_id,
+                "sender_device_id": sender_device_id,
+                "seq": seq,
+                "client_msg_id": item.client_msg_id,
+                "payload": item.payload,
+                "created_at": created_at,
+                "updated_at": None,
+                "updated": False,
+                "status": MessageStatus.sent,
+                "changed_at": created_at,
+                "expires_at": message_expiry(
+                    created_at, chat_ttls[item.chat_id], item.ttl_seconds
+                ),
+            }
+            rows.append(row)
+            receiver_usernames, receiver_ids = receivers[item.chat_id]
+            results[i] = (
+                MessageSchema(
+                    message_id=str(row["message_id"]),
+                    chat_id=str(item.chat_id),
+                    sender_id=str(sender_id),
+                    sender_username=sender_username,
+                    sender_device_id=str(sender_device_id),
+                    seq=seq,
+                    client_msg_id=item.client_msg_id,
+                    payload=item.payload,
+                    created_at=created_at,
+                    expires_at=row["expires_at"],
+                    status=MessageStatus.sent,
+                    receiver_username=receiver_usernames,
+                    receiver_id=receiver_ids,
+                ),
+                True,
+            )
+
+        await db.execute(insert(Message).values(rows))
+        await db.execute(
+            insert(OutboxEvent).values(
+                [
+                    {
+                        "kind": "message",
+                        "chat_id": items[i].chat_id,
+                        "payload": results[i][0].model_dump_json(),
+                    }
+                    for i in fresh
+                ]
+            )
+        )
+
+    for i, first in repeats:
+        results[i] = (results[first][0], False)
+    return cast(list[tuple[MessageSchema, bool]], results)
@@ -0,0 +1,138 @@
+import base64
+import logging
+import time
+import zlib
+from dataclasses import dataclass
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+try:
+    from compression import zstd
+except ImportError:  # Python < 3.14, or built without libzstd
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+# A stored payload starting with ESC carries a two-character codec tag. Client
+# text that itself starts with ESC is stored behind the raw tag, so plain rows
+# never need decoding and SQL can tell compressed rows apart by first char.
+MARKER = "\x1b"
+_RAW = MARKER + "r"
+_TAGS = {"zlib": MARKER + "z", "zstd": MARKER + "s"}
+
+
+@dataclass
+class CompressionStats:
+    stored: int = 0
+    compressed: int = 0
+    # Over the threshold but not smaller once encoded, so stored as is.
+    incompressible: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    compress_seconds: float = 0.0
+    decompressed: int = 0
+    decompress_seconds: float = 0.0
+
+    def snapshot(self) -> dict:
+        ratio = self.bytes_in / self.bytes_out if self.bytes_out else 1.0
+        return {
+            "stored": self.stored,
+            "compressed": self.compressed,
+            "incompressible": self.incompressible,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(ratio, 3),
+            "compress_us_avg": _micros(
+                self.compress_seconds, self.compressed + self.incompressible
+            ),
+            "decompressed": self.decompressed,
+            "decompress_us_avg": _micros(self.decompress_seconds, self.decompressed),
+        }
+
+
+def _micros(seconds: float, count: int) -> float | None:
+    return round(seconds / count * 1e6, 1) if count else None
+
+
+class PayloadCodec:
+    """Compresses message text above a size threshold into a tagged string.
+
+    The compressed bytes are base85-encoded so the column stays ``Text``;
+    values that do not shrink enough to pay for that are stored unchanged.
+    Decoding understands every tag whatever the configured codec is.
+    """
+
+    def __init__(self, codec: str, min_bytes: int, level: int) -> None:
+        if codec == "zstd" and zstd is None:
+            logger.warning("zstd is not available; compressing payloads with zlib")
+            codec = "zlib"
+        if codec not in (*_TAGS, "none"):
+            raise ValueError(f"Unknown payload codec: {codec}")
+        self.codec = codec
+        self.min_bytes = min_bytes
+        self.level = level
+        self.stats = CompressionStats()
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstd.compress(data, level=self.level)
+        return zlib.compress(data, self.level)
+
+    def encode(self, text: str) -> str:
+        stats = self.stats
+        stats.stored += 1
+        data = text.encode()
+        if self.codec != "none" and len(data) >= self.min_bytes:
+            start = time.perf_counter()
+            packed = base64.b85encode(self._compress(data)).decode("ascii")
+            stats.compress_seconds += time.perf_counter() - start
+            if len(packed) + 2 < len(data):
+                stats.compressed += 1
+                stats.bytes_in += len(data)
+                stats.bytes_out += len(packed) + 2
+                return _TAGS[self.codec] + packed
+            stats.incompressible += 1
+        stats.bytes_in += len(data)
+        stats.bytes_out += len(data)
+        return _RAW + text if text.startswith(MARKER) else text
+
+    def decode(self, stored: str) -> str:
+        if not stored.startswith(MARKER):
+            return stored
+        tag, body = stored[:2], stored[2:]
+        if tag == _RAW:
+            return body
+        start = time.perf_counter()
+        data = base64.b85decode(body)
+        if tag == _TAGS["zlib"]:
+            text = zlib.decompress(data).decode()
+        elif tag == _TAGS["zstd"] and zstd is not None:
+            text = zstd.decompress(data).decode()
+        else:
+            raise ValueError(f"Unknown payload codec tag: {tag!r}")
+        self.stats.decompress_seconds += time.perf_counter() - start
+        self.stats.decompressed += 1
+        return text
+
+
+payload_codec = PayloadCodec(
+    settings.payload_compression,
+    settings.payload_compression_min_bytes,
+    settings.payload_compression_level,
+)
+
+
+class CompressedText(TypeDecorator):
+    """``Text`` column whose values go through ``payload_codec`` both ways."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else payload_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else payload_codec.decode(value)
@@ -0,0 +1,123 @@
+import logging
+import re
+from collections.abc import Iterable
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+PARENT = "messages"
+DEFAULT_PARTITION = f"{PARENT}_default"
+_MONTHLY = re.compile(rf"^{PARENT}_(\d{{4}})_(\d{{2}})$")
+
+
+def is_partitioned(conn: Connection) -> bool:
+    # Only Postgres gets partitions; everywhere else messages is a plain table.
+    return conn.dialect.name == "postgresql"
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_{month:%Y_%m}"
+
+
+def create_default_partition(conn: Connection) -> None:
+    # Catches rows outside every monthly range instead of failing the insert.
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+            f"PARTITION OF {PARENT} DEFAULT"
+        )
+    )
+
+
+def create_month_partition(conn: Connection, month: date) -> str:
+    name = partition_name(month)
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} "
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{add_months(month, 1).isoformat()}')"
+        )
+    )
+    return name
+
+
+def monthly_partitions(conn: Connection) -> dict[date, str]:
+    result = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ),
+        {"parent": PARENT},
+    )
+    partitions = {}
+    for (name,) in result:
+        match = _MONTHLY.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def ensure_partitions(
+    conn: Connection, months_ahead: int, now: datetime | None = None
+) -> list[str]:
+    """Create this month's partition and the next ``months_ahead`` ones."""
+    if not is_partitioned(conn):
+        return []
+    if now is None:
+        now = datetime.now(timezone.utc)
+    existing = monthly_partitions(conn)
+    create_default_partition(conn)
+    created = []
+    current = month_start(now)
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            created.append(create_month_partition(conn, month))
+    return created
+
+
+def ensure_month_partitions(conn: Connection, months: Iterable[date]) -> list[str]:
+    # For writes of historic rows, which would otherwise land in the default.
+    if not is_partitioned(conn):
+        return []
+    existing = monthly_partitions(conn)
+    return [
+        create_month_partition(conn, month)
+        for month in sorted(set(months))
+        if month not in existing
+    ]
+
+
+def detach_partitions_before(
+    conn: Connection, cutoff: date, drop: bool = False
+) -> list[str]:
+    """Detach monthly partitions that end on or before ``cutoff``.
+
+    Detached partitions stay behind as ordinary tables for archiving unless
+    ``drop`` is set. Either way it is a catalog change, not a row-by-row delete.
+    """
+    if not is_partitioned(conn):
+        return []
+    detached = []
+    for month, name in sorted(monthly_partitions(conn).items()):
+        if add_months(month, 1) > cutoff:
+            break
+        conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
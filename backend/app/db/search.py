@@ -0,0 +1,108 @@
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine import Connection
+from sqlalchemy.types import TypeDecorator
+
+from app.db.compression import payload_codec
+
+# Text search configuration: no stemming or stop words, so it works for any
+# language people chat in.
+TS_CONFIG = "simple"
+
+# Payloads may be stored compressed (see app.db.compression), so neither index
+# reads the column directly. Postgres gets its vector built by the app from the
+# plain text on insert; SQLite's triggers decode through payload_text(), which
+# register_search_functions() adds to every connection.
+PG_SEARCH_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_messages_search ON messages "
+    "USING GIN (search_vector)",
+    # Fuzzy username lookups; prefix ones are served from memory.
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users "
+    "USING GIN (normalized_username gin_trgm_ops)",
+)
+
+# messages has no INTEGER PRIMARY KEY, so its rowid can change on VACUUM and
+# is no key to share. Each message instead gets a stable docid from
+# messages_fts_keys, which the FTS5 row uses as its rowid and the delete and
+# update triggers look up by message_id; searches join on message_id.
+_DOCID = "(SELECT docid FROM messages_fts_keys WHERE message_id = {}.message_id)"
+SQLITE_SEARCH_TRIGGERS = {
+    "messages_fts_insert": (
+        "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts_keys (message_id) VALUES (new.message_id); "
+        "INSERT INTO messages_fts (rowid, payload, message_id, chat_id) "
+        f"VALUES ({_DOCID.format('new')}, payload_text(new.payload), "
+        "new.message_id, new.chat_id); END"
+    ),
+    "messages_fts_delete": (
+        "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+        f"DELETE FROM messages_fts WHERE rowid = {_DOCID.format('old')}; "
+        "DELETE FROM messages_fts_keys WHERE message_id = old.message_id; END"
+    ),
+    "messages_fts_update": (
+        "CREATE TRIGGER messages_fts_update AFTER UPDATE OF payload ON messages "
+        "BEGIN UPDATE messages_fts SET payload = payload_text(new.payload) "
+        f"WHERE rowid = {_DOCID.format('old')}; END"
+    ),
+}
+SQLITE_SEARCH_DDL = (
+    "CREATE TABLE messages_fts_keys ("
+    "docid INTEGER PRIMARY KEY, message_id NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE messages_fts USING fts5("
+    "payload, message_id UNINDEXED, chat_id UNINDEXED, tokenize = 'unicode61')",
+    *SQLITE_SEARCH_TRIGGERS.values(),
+    "INSERT INTO messages_fts_keys (message_id) SELECT message_id FROM messages",
+    "INSERT INTO messages_fts (rowid, payload, message_id, chat_id) "
+    "SELECT k.docid, payload_text(m.payload), m.message_id, m.chat_id "
+    "FROM messages m JOIN messages_fts_keys k ON k.message_id = m.message_id",
+)
+
+
+class SearchVector(TypeDecorator):
+    """Postgres ``tsvector`` column that is bound as the text to index."""
+
+    impl = TSVECTOR
+    cache_ok = True
+
+    def bind_expression(self, bindvalue):
+        return func.to_tsvector(literal_column(f"'{TS_CONFIG}'"), bindvalue)
+
+
+def search_text(context) -> str | None:
+    # Column default: the payload as sent, before the column type encodes it.
+    if context.dialect.name != "postgresql":
+        return None
+    return context.get_current_parameters().get("payload")
+
+
+def register_search_functions(dbapi_connection, connection_record) -> None:
+    # Connect hook for SQLite engines; the FTS triggers call payload_text().
+    dbapi_connection.create_function(
+        "payload_text", 1, payload_codec.decode, deterministic=True
+    )
+
+
+def ensure_search_index(conn: Connection) -> None:
+    """Create the full-text index for this dialect, or bring it up to date."""
+    if conn.dialect.name == "postgresql":
+        for statement in PG_SEARCH_DDL:
+            conn.execute(text(statement))
+    elif conn.dialect.name == "sqlite":
+        current = dict(
+            conn.execute(
+                text(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+                    "AND name LIKE 'messages_fts%'"
+                )
+            ).all()
+        )
+        if current == SQLITE_SEARCH_TRIGGERS:
+            return
+        # Missing or built by an older definition: rebuild from the messages.
+        for name in current:
+            conn.execute(text(f"DROP TRIGGER {name}"))
+        conn.execute(text("DROP TABLE IF EXISTS messages_fts"))
+        conn.execute(text("DROP TABLE IF EXISTS messages_fts_keys"))
+        for statement in SQLITE_SEARCH_DDL:
+            conn.execute(text(statement))
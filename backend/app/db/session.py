@@ -1,8 +1,11 @@
 import os
 from dotenv import load_dotenv
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
+from app.db.search import register_search_functions
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -21,6 +24,8 @@ engine = create_async_engine(
     connect_args={"connect_timeout": 10},
     pool_timeout=25,
 )
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", register_search_functions)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
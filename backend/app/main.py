@@ -5,8 +5,18 @@ from contextlib import asynccontextmanager
 from app.db.base import Base
 from app.db.session import engine
 from app.core.config import settings
+from app.core.ws_settings import fanout_pool
+from app.worker import (
+    broadcast_relay,
+    message_archiver,
+    message_purger,
+    notification_dispatcher,
+    outbox_relay,
+    partition_maintainer,
+)
+from app.services.user_index import user_index
 
-from app.api.v1.routes import auth, session, user, setting, ws_chat, chat
+from app.api.v1.routes import auth, session, user, setting, ws_chat, chat, admin
 
 root = "/api/v1"
 ath = "/auth"
@@ -22,7 +32,31 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Failed to create tables: {e}")
         raise
+    ws_chat.receipts.start()
+    ws_chat.typing_tracker.start()
+    ws_chat.heartbeats.start()
+    fanout_pool.start()
+    ws_chat.presence.start()
+    outbox_relay.start()
+    broadcast_relay.start()
+    partition_maintainer.start()
+    message_purger.start()
+    message_archiver.start()
+    user_index.start()
+    notification_dispatcher.start()
     yield
+    await notification_dispatcher.stop()
+    await user_index.stop()
+    await message_archiver.stop()
+    await message_purger.stop()
+    await partition_maintainer.stop()
+    await broadcast_relay.stop()
+    await outbox_relay.stop()
+    await ws_chat.presence.stop()
+    await fanout_pool.stop()
+    await ws_chat.heartbeats.stop()
+    await ws_chat.typing_tracker.stop()
+    await ws_chat.receipts.stop()
 
 app = FastAPI(
     lifespan=lifespan,
@@ -44,4 +78,5 @@ app.include_router(session.router, prefix=f"{root}{usr}{sessions}", tags=["Sessi
 app.include_router(user.router, prefix=f"{root}{usr}", tags=["User"])
 app.include_router(setting.router, prefix=f"{root}{usr}", tags=["Settings"])
 app.include_router(ws_chat.router, tags=["Websocket"])
-app.include_router(chat.router, prefix=f"{root}{usr}", tags=["Chats"])
\ No newline at end of file
+app.include_router(chat.router, prefix=f"{root}{usr}", tags=["Chats"])
+app.include_router(admin.router, prefix=f"{root}/admin", tags=["Admin"])
\ No newline at end of file
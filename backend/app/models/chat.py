@@ -1,34 +1,74 @@
+from app.core.config import settings
 from app.db.base import Base
+from app.db.compression import CompressedText
+from app.db.partitions import ensure_partitions
+from app.db.search import SearchVector, ensure_search_index, search_text
 from app.schemas.chat import ChatType, ChatMembersRole, MessageStatus
 
 import uuid
 
-from datetime import datetime
+from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, Enum, ForeignKey, func, UniqueConstraint, Text, Boolean
+from sqlalchemy import (
+    DateTime,
+    event,
+    Enum,
+    ForeignKey,
+    func,
+    UniqueConstraint,
+    Boolean,
+    Integer,
+    Index,
+    String,
+    Text,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
 
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _not_postgresql(ddl, target, bind, dialect, **kw) -> bool:
+    return dialect.name != "postgresql"
+
+
 class Chat(Base):
     __tablename__ = "chats"
 
     chat_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid7, nullable=False
     )
     type: Mapped[ChatType] = mapped_column(
         Enum(ChatType, native_enum=False), nullable=False
     )
+    # Only group chats have one.
+    title: Mapped[str | None] = mapped_column(String(100), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, nullable=False, default=func.now()
     )
+    # Sequence number of the newest message; incremented on every send.
+    last_seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Every message up to this seq is gone from the table, purged or archived;
+    # unread counts start above it. Advanced by the purger.
+    expired_seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Upper bound on message lifetime in this chat; None keeps messages forever.
+    message_ttl_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Bumped by anything but a send that changes the chat or how its messages
+    # read: receipts, membership, renames, expiry. Sends move last_seq instead.
+    # HTTP validators and the recent-message cache derive from the pair.
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=_utcnow, onupdate=_utcnow
+    )
 
 
 class ChatMembers(Base):
     __tablename__ = "chat_members"
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid7
     )
     chat_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -46,6 +86,8 @@ class ChatMembers(Base):
     role: Mapped[ChatMembersRole] = mapped_column(
         Enum(ChatMembersRole, native_enum=False), nullable=False
     )
+    last_read_seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_read_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     __table_args__ = (UniqueConstraint("chat_id", "user_id", name="uq_chat_user"),)
 
@@ -54,7 +96,7 @@ class Message(Base):
     __tablename__ = "messages"
 
     message_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid7, nullable=False
     )
     chat_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -74,10 +116,79 @@ class Message(Base):
         nullable=False,
         index=True,
     )
-    payload: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    client_msg_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Large payloads are stored compressed; see app.db.compression.
+    payload: Mapped[str] = mapped_column(CompressedText, nullable=False)
+    # Part of the key because Postgres range-partitions messages on it.
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, primary_key=True, default=_utcnow
+    )
     updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     updated: Mapped[bool] = mapped_column(Boolean, default=False)
     status: Mapped[MessageStatus] = mapped_column(
         Enum(MessageStatus, native_enum=False), nullable=False
     )
+    # Bumped on every insert/update so clients can sync deltas by watermark.
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=_utcnow, onupdate=_utcnow
+    )
+    # Hidden from reads once passed; the purger deletes by this index.
+    expires_at: Mapped[datetime | None] = mapped_column(
+        DateTime, nullable=True, index=True
+    )
+    # Full-text vector of the plain payload, Postgres only (NULL elsewhere;
+    # SQLite searches through messages_fts). Never loaded with the row.
+    search_vector: Mapped[str | None] = mapped_column(
+        SearchVector().with_variant(Text(), "sqlite"),
+        nullable=True,
+        default=search_text,
+        deferred=True,
+    )
+
+    # Unique indexes on a partitioned table must contain the partition key, so
+    # on Postgres they only refuse a row inserted twice. Uniqueness across
+    # created_at rests on the chat row lock every send takes before it checks
+    # and assigns seq and client_msg_id.
+    __table_args__ = (
+        Index("ix_messages_chat_seq", "chat_id", "seq", unique=True).ddl_if(
+            callable_=_not_postgresql
+        ),
+        Index(
+            "ix_messages_chat_seq_part", "chat_id", "seq", "created_at", unique=True
+        ).ddl_if(dialect="postgresql"),
+        # History pages walk (created_at, message_id); v7 ids break timestamp ties.
+        Index("ix_messages_chat_created", "chat_id", "created_at", "message_id"),
+        # Delta sync walks (changed_at, message_id) within each of a user's chats.
+        Index("ix_messages_chat_changed", "chat_id", "changed_at", "message_id"),
+        # Next expiry per chat, which the history ETag depends on.
+        Index(
+            "ix_messages_chat_expires",
+            "chat_id",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+            sqlite_where=text("expires_at IS NOT NULL"),
+        ),
+        UniqueConstraint(
+            "sender_device_id", "client_msg_id", name="uq_message_device_client_msg"
+        ).ddl_if(callable_=_not_postgresql),
+        Index(
+            "ix_messages_device_client_msg",
+            "sender_device_id",
+            "client_msg_id",
+            "created_at",
+            unique=True,
+        ).ddl_if(dialect="postgresql"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+@event.listens_for(Message.__table__, "after_create")
+def _create_message_partitions(target, connection, **kw) -> None:
+    ensure_partitions(connection, settings.message_partition_months_ahead)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_message_search_index(target, connection, **kw) -> None:
+    # Runs on every create_all so existing databases pick the index up too.
+    ensure_search_index(connection)
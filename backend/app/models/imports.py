@@ -0,0 +1,22 @@
+from app.db.base import Base
+
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    # Caller-chosen name of the dump, e.g. "legacy-2024-export".
+    source: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # Last input record whose rows are committed; resuming starts after it.
+    line: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Input records consumed so far, including skipped ones.
+    rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None),
+    )
@@ -0,0 +1,50 @@
+from app.db.base import Base
+
+import uuid
+
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class NotificationJob(Base):
+    """One pending digest per (user, chat); new messages fold into it."""
+
+    __tablename__ = "notification_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid7
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("users.user_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    chat_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("chats.chat_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    first_seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Sender and opening text of the newest message folded in.
+    last_sender: Mapped[str] = mapped_column(String(50), nullable=False)
+    preview: Mapped[str] = mapped_column(String(200), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=_utcnow
+    )
+    # Set once when the digest opens, so later messages never postpone it.
+    deliver_after: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "chat_id", name="uq_notification_user_chat"),
+        Index("ix_notification_jobs_deliver_after", "deliver_after"),
+    )
@@ -0,0 +1,30 @@
+from app.db.base import Base
+
+import uuid
+
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, Index, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ChatPresence(Base):
+    """A member with a socket open in a chat on one process."""
+
+    __tablename__ = "chat_presence"
+
+    # Same name as the process's broadcast cursor.
+    instance: Mapped[str] = mapped_column(String(64), primary_key=True)
+    chat_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    # Re-stamped while the process runs; rows of a dead process go stale.
+    seen_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=_utcnow
+    )
+
+    __table_args__ = (Index("ix_chat_presence_chat_user", "chat_id", "user_id"),)
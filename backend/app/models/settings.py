@@ -17,3 +17,12 @@ class UserSettings(Base):
     notifications_enabled: Mapped[bool] = mapped_column(
         Boolean, default=True, nullable=False
     )
+
+
+def default_settings() -> dict:
+    # What a user without a settings row gets; the row is created on demand.
+    return {
+        column.key: column.default.arg
+        for column in UserSettings.__table__.columns
+        if column.default is not None
+    }
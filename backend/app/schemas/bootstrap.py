@@ -0,0 +1,25 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from app.schemas.chat import ChatOut
+from app.schemas.session import SessionRead
+from app.schemas.settings import SettingsRead
+from app.schemas.user import UserRead
+
+
+class BootstrapVersions(BaseModel):
+    me: str
+    settings: str
+    sessions: str
+    chats: str
+
+
+class Bootstrap(BaseModel):
+    me: UserRead
+    settings: SettingsRead
+    sessions: List[SessionRead]
+    chats: List[ChatOut]
+    # Opaque per-section tokens; a section changed iff its token did. chats is
+    # also the GET /chats ETag.
+    versions: BootstrapVersions
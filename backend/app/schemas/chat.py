@@ -1,9 +1,18 @@
 import uuid
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from enum import Enum
 from datetime import datetime
 from typing import List
 
+MAX_MESSAGE_LENGTH = 4000
+MAX_CLIENT_MSG_ID_LENGTH = 64
+MAX_MESSAGE_TTL_SECONDS = 30 * 24 * 3600
+MAX_GROUP_TITLE_LENGTH = 100
+# User ids accepted by one group create or membership call.
+MAX_GROUP_BATCH = 5000
+# Messages accepted by one batch send.
+MAX_SEND_BATCH = 100
+
 
 class ChatType(str, Enum):
     private = "private"
@@ -38,21 +47,85 @@ class ChatMember(BaseModel):
 class ChatOut(BaseModel):
     chat_id: uuid.UUID
     type: ChatType
+    title: str | None = None
     created_at: datetime
+    message_ttl_seconds: int | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class GroupCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=MAX_GROUP_TITLE_LENGTH)
+    member_ids: List[uuid.UUID] = Field(
+        default_factory=list, max_length=MAX_GROUP_BATCH
+    )
+
+
+class GroupMembersIn(BaseModel):
+    user_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=MAX_GROUP_BATCH)
+
+
+class GroupMembersAdd(GroupMembersIn):
+    role: ChatMembersRole = ChatMembersRole.member
+
+
+class GroupMembersChanged(BaseModel):
+    chat_id: uuid.UUID
+    changed: int
+
+
 class Message(BaseModel):
     message_id: str
     chat_id: str
     sender_id: str
     sender_username: str
     sender_device_id: str
+    seq: int | None = None
+    client_msg_id: str | None = None
     payload: str
     created_at: datetime
     updated_at: datetime | None = None
+    expires_at: datetime | None = None
     status: MessageStatus
     receiver_id: List[str] | None = None
     receiver_device_id: List[str] | None = None
     receiver_username: List[str] | None = None
+
+
+class MessageIn(BaseModel):
+    chat_id: uuid.UUID
+    payload: str = Field(..., min_length=1, max_length=MAX_MESSAGE_LENGTH)
+    client_msg_id: str | None = Field(
+        None, min_length=1, max_length=MAX_CLIENT_MSG_ID_LENGTH
+    )
+    ttl_seconds: int | None = Field(None, ge=1, le=MAX_MESSAGE_TTL_SECONDS)
+
+
+class SyncPage(BaseModel):
+    messages: List[Message]
+    next_since: datetime | None = None
+    next_after_id: str | None = None
+    has_more: bool = False
+
+
+class SearchHit(BaseModel):
+    message: Message
+    # Higher is more relevant; only comparable within one query.
+    rank: float
+    highlight: str
+
+
+class SearchPage(BaseModel):
+    hits: List[SearchHit]
+    next_score: float | None = None
+    next_after_id: str | None = None
+    has_more: bool = False
+
+
+class ChatUnread(BaseModel):
+    chat_id: uuid.UUID
+    last_seq: int
+    last_read_seq: int
+    unread: int
+
+    model_config = ConfigDict(from_attributes=True)
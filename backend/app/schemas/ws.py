@@ -0,0 +1,50 @@
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, Field
+
+from app.schemas.chat import (
+    MAX_CLIENT_MSG_ID_LENGTH,
+    MAX_MESSAGE_LENGTH,
+    MAX_MESSAGE_TTL_SECONDS,
+    MessageStatus,
+)
+
+
+class SendMessageFrame(BaseModel):
+    event: Literal["send_message"]
+    payload: str = Field(..., min_length=1, max_length=MAX_MESSAGE_LENGTH)
+    client_msg_id: str | None = Field(
+        None, min_length=1, max_length=MAX_CLIENT_MSG_ID_LENGTH
+    )
+    ttl_seconds: int | None = Field(None, ge=1, le=MAX_MESSAGE_TTL_SECONDS)
+
+
+class TypingPayload(BaseModel):
+    state: Literal["start", "stop"] = "start"
+
+
+class TypingFrame(BaseModel):
+    event: Literal["typing"]
+    payload: TypingPayload | None = None
+
+
+class AckPayload(BaseModel):
+    seq: int = Field(..., ge=1)
+    status: Literal[MessageStatus.delivered, MessageStatus.read] = (
+        MessageStatus.delivered
+    )
+
+
+class AckFrame(BaseModel):
+    event: Literal["ack"]
+    payload: AckPayload
+
+
+class PongFrame(BaseModel):
+    event: Literal["pong"]
+
+
+ClientFrame = Annotated[
+    SendMessageFrame | TypingFrame | AckFrame | PongFrame,
+    Field(discriminator="event"),
+]
@@ -0,0 +1,273 @@
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+
+_EPOCH = datetime(1970, 1, 1)
+
+# One sparse index entry per compressed block:
+# first key, last key (each as microseconds + message id), offset, length, count.
+_ENTRY = struct.Struct("<q16sq16sQII")
+
+ArchiveKey = tuple[datetime, uuid.UUID]
+
+
+def _pack_key(key: ArchiveKey) -> tuple[int, bytes]:
+    created_at, message_id = key
+    return (created_at - _EPOCH) // timedelta(microseconds=1), message_id.bytes
+
+
+def _unpack_key(micros: int, raw: bytes) -> ArchiveKey:
+    return _EPOCH + timedelta(microseconds=micros), uuid.UUID(bytes=raw)
+
+
+def record_key(record: dict) -> ArchiveKey:
+    return (
+        datetime.fromisoformat(record["created_at"]),
+        uuid.UUID(record["message_id"]),
+    )
+
+
+@dataclass(slots=True)
+class _Block:
+    first: ArchiveKey
+    last: ArchiveKey
+    offset: int
+    length: int
+    count: int
+
+
+class Segment:
+    """One immutable .seg file of zlib blocks plus its sparse .idx."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path + ".idx", "rb") as f:
+            raw = f.read()
+        self.blocks = [
+            _Block(
+                _unpack_key(first_us, first_id),
+                _unpack_key(last_us, last_id),
+                offset,
+                length,
+                count,
+            )
+            for first_us, first_id, last_us, last_id, offset, length, count
+            in _ENTRY.iter_unpack(raw)
+        ]
+        self._firsts = [block.first for block in self.blocks]
+        self._map: mmap.mmap | None = None
+
+    @property
+    def first(self) -> ArchiveKey:
+        return self.blocks[0].first
+
+    @property
+    def last(self) -> ArchiveKey:
+        return self.blocks[-1].last
+
+    def _read_block(self, block: _Block) -> list[dict]:
+        mapping = self._map
+        if mapping is None:
+            with open(self.path, "rb") as f:
+                mapping = self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = zlib.decompress(mapping[block.offset : block.offset + block.length])
+        return [json.loads(line) for line in data.splitlines()]
+
+    def read_before(self, before: ArchiveKey | None, limit: int) -> list[dict]:
+        # Newest first; only the blocks that can hold keys below `before` are
+        # located by bisecting the index, then decompressed one at a time.
+        end = len(self.blocks)
+        if before is not None:
+            end = bisect_left(self._firsts, before)
+        records: list[dict] = []
+        for block in reversed(self.blocks[:end]):
+            rows = self._read_block(block)
+            if before is not None and block.last >= before:
+                rows = [r for r in rows if record_key(r) < before]
+            records.extend(reversed(rows))
+            if len(records) >= limit:
+                break
+        return records[:limit]
+
+    def read_all(self) -> list[dict]:
+        return [r for block in self.blocks for r in self._read_block(block)]
+
+    def iter_records(self) -> Iterator[dict]:
+        for block in self.blocks:
+            yield from self._read_block(block)
+
+    def find(self, message_id: uuid.UUID, hint: datetime | None) -> dict | None:
+        blocks = self.blocks
+        if hint is not None:
+            # A v7 id is minted within moments of created_at, so only blocks
+            # spanning that neighbourhood need decompressing.
+            low, high = hint - timedelta(minutes=5), hint + timedelta(minutes=5)
+            blocks = [b for b in blocks if b.first[0] <= high and b.last[0] >= low]
+        for block in blocks:
+            for record in self._read_block(block):
+                if record["message_id"] == str(message_id):
+                    return record
+        return None
+
+
+class _ChatArchive:
+    __slots__ = ("mtime", "segments")
+
+    def __init__(self, mtime: int, segments: list[Segment]) -> None:
+        self.mtime = mtime
+        self.segments = segments
+
+
+class ArchiveStore:
+    """Per-chat, append-only compressed segments of archived messages on disk.
+
+    Every archiving run for a chat appends one new segment; nothing is ever
+    rewritten, so readers in any worker only need to notice new files, which
+    they do by checking the chat directory's mtime. Reads block on disk and
+    zlib, so async callers run them in a thread; dropped segments are not
+    closed here, since a reader may still hold one, and their maps close once
+    the last reference goes.
+    """
+
+    def __init__(self, root: str, block_messages: int, max_open_chats: int) -> None:
+        self.root = root
+        self.block_messages = block_messages
+        self.max_open_chats = max_open_chats
+        self._chats: OrderedDict[str, _ChatArchive] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _chat_dir(self, chat_id: uuid.UUID) -> str:
+        return os.path.join(self.root, str(chat_id))
+
+    def _segments(self, chat_id: uuid.UUID) -> list[Segment]:
+        key = str(chat_id)
+        path = self._chat_dir(chat_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            cached = self._chats.get(key)
+            if cached is not None and cached.mtime == mtime:
+                self._chats.move_to_end(key)
+                return cached.segments
+            segments = [
+                Segment(os.path.join(path, name[: -len(".idx")]))
+                for name in sorted(os.listdir(path))
+                if name.endswith(".seg.idx")
+            ]
+            self._chats[key] = _ChatArchive(mtime, segments)
+            self._chats.move_to_end(key)
+            while len(self._chats) > self.max_open_chats:
+                self._chats.popitem(last=False)
+            return segments
+
+    def newest_key(self, chat_id: uuid.UUID) -> ArchiveKey | None:
+        segments = self._segments(chat_id)
+        return max((s.last for s in segments), default=None)
+
+    def read_before(
+        self, chat_id: uuid.UUID, before: ArchiveKey | None, limit: int
+    ) -> list[dict]:
+        records: list[dict] = []
+        for segment in self._segments(chat_id):
+            if before is None or segment.first < before:
+                records.extend(segment.read_before(before, limit))
+        records.sort(key=record_key, reverse=True)
+        return records[:limit]
+
+    def read_all(self, chat_id: uuid.UUID) -> list[dict]:
+        records = [r for s in self._segments(chat_id) for r in s.read_all()]
+        records.sort(key=record_key)
+        return records
+
+    def iter_records(self, chat_id: uuid.UUID) -> Iterator[dict]:
+        # Oldest first, holding one decompressed block per segment at a time.
+        return heapq.merge(
+            *(s.iter_records() for s in self._segments(chat_id)), key=record_key
+        )
+
+    def find(
+        self, chat_id: uuid.UUID, message_id: uuid.UUID, hint: datetime | None
+    ) -> dict | None:
+        segments = self._segments(chat_id)
+        # Imported rows can carry a created_at far from their id, so a miss
+        # around the hint falls back to scanning every block.
+        for guess in (hint, None) if hint is not None else (None,):
+            for segment in reversed(segments):
+                record = segment.find(message_id, guess)
+                if record is not None:
+                    return record
+        return None
+
+    def write_segment(self, chat_id: uuid.UUID, records: list[dict]) -> str:
+        """Append ``records`` (sorted by key) to the chat as a new segment.
+
+        The .idx is renamed into place last, so a segment only becomes visible
+        once both files are complete.
+        """
+        path = self._chat_dir(chat_id)
+        os.makedirs(path, exist_ok=True)
+        name = self._reserve_name(path)
+
+        index = bytearray()
+        offset = 0
+        with open(name + ".tmp", "wb") as data:
+            for start in range(0, len(records), self.block_messages):
+                chunk = records[start : start + self.block_messages]
+                body = zlib.compress(
+                    b"\n".join(
+                        json.dumps(r, separators=(",", ":")).encode() for r in chunk
+                    )
+                )
+                data.write(body)
+                index += _ENTRY.pack(
+                    *_pack_key(record_key(chunk[0])),
+                    *_pack_key(record_key(chunk[-1])),
+                    offset,
+                    len(body),
+                    len(chunk),
+                )
+                offset += len(body)
+            data.flush()
+            os.fsync(data.fileno())
+        with open(name + ".idx.tmp", "wb") as idx:
+            idx.write(index)
+            idx.flush()
+            os.fsync(idx.fileno())
+        os.replace(name + ".tmp", name)
+        os.replace(name + ".idx.tmp", name + ".idx")
+        return name
+
+    @staticmethod
+    def _reserve_name(path: str) -> str:
+        # Created with O_EXCL, so two writers can never settle on the same
+        # segment; the loser moves on to the next number.
+        index = sum(1 for n in os.listdir(path) if n.endswith(".seg"))
+        while True:
+            name = os.path.join(path, f"{index:08d}.seg")
+            try:
+                os.close(os.open(name, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                index += 1
+                continue
+            return name
+
+
+archive = ArchiveStore(
+    root=settings.archive_dir,
+    block_messages=settings.archive_block_messages,
+    max_open_chats=settings.archive_open_chats,
+)
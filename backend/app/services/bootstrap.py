@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.http_cache import chat_list_etag, make_etag
+from app.db.session import AsyncSessionLocal
+from app.models.chat import Chat, ChatMembers
+from app.models.session import Session
+from app.models.settings import UserSettings, default_settings
+from app.models.user import User
+from app.schemas.bootstrap import Bootstrap, BootstrapVersions
+from app.schemas.chat import ChatOut
+from app.schemas.session import SessionRead
+from app.schemas.settings import SettingsRead
+from app.schemas.user import UserRead
+
+
+async def _settings(user: User) -> SettingsRead:
+    async with AsyncSessionLocal() as db:
+        row = await db.get(UserSettings, user.user_id)
+    if row is None:
+        # Reads must not write; the settings routes create the row on demand.
+        return SettingsRead(**default_settings())
+    return SettingsRead.model_validate(row)
+
+
+async def _sessions(user: User) -> list[SessionRead]:
+    async with AsyncSessionLocal() as db:
+        result = await db.scalars(
+            select(Session).where(
+                Session.user_id == user.user_id,
+                Session.is_active.is_(True),
+                Session.expires_at > datetime.now(timezone.utc),
+            )
+        )
+        return [SessionRead.model_validate(s) for s in result]
+
+
+async def _chats(db: AsyncSession, user: User) -> list[Chat]:
+    result = await db.scalars(
+        select(Chat).join(ChatMembers).where(ChatMembers.user_id == user.user_id)
+    )
+    return list(result)
+
+
+async def load_bootstrap(db: AsyncSession, user: User) -> Bootstrap:
+    """Everything a client needs on launch, read concurrently.
+
+    The inbox reuses the request's session, whose connection auth already
+    holds; settings and sessions each take their own from the pool so the
+    three reads overlap.
+    """
+    settings, sessions, chats = await asyncio.gather(
+        _settings(user), _sessions(user), _chats(db, user)
+    )
+    versions = BootstrapVersions(
+        me=make_etag(user.user_id, user.display_username),
+        settings=make_etag(settings.max_sessions, settings.notifications_enabled),
+        sessions=make_etag(*sorted((s.id, s.expires_at) for s in sessions)),
+        # The GET /chats ETag, so clients can revalidate with it directly.
+        chats=chat_list_etag(
+            user.user_id, len(chats), max((c.changed_at for c in chats), default=None)
+        ),
+    )
+    return Bootstrap(
+        me=UserRead.model_validate(user),
+        settings=settings,
+        sessions=sessions,
+        chats=[ChatOut.model_validate(chat) for chat in chats],
+        versions=versions,
+    )
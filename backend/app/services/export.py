@@ -0,0 +1,121 @@
+import asyncio
+import json
+import uuid
+import zlib
+from collections.abc import AsyncIterator
+from itertools import islice
+
+from sqlalchemy import select
+
+from app.crud.chat import not_expired
+from app.db.session import AsyncSessionLocal
+from app.models.chat import Message
+from app.models.user import User
+from app.services.archive import archive, record_key
+
+# Rows fetched per round trip from the server-side cursor.
+EXPORT_FETCH_SIZE = 500
+# Bytes of NDJSON gathered before a chunk is handed to the response.
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _line(record: dict) -> bytes:
+    text = json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+    return text.encode() + b"\n"
+
+
+async def _archived_records(chat_id: uuid.UUID) -> AsyncIterator[dict]:
+    # Oldest first. Listing segments and decompressing blocks is blocking work,
+    # so it runs in a worker thread, a batch of records per call.
+    records = await asyncio.to_thread(archive.iter_records, chat_id)
+    while batch := await asyncio.to_thread(list, islice(records, EXPORT_FETCH_SIZE)):
+        for record in batch:
+            yield record
+
+
+async def _export_lines(chat_id: uuid.UUID) -> AsyncIterator[bytes]:
+    # Its own session: the request's one is gone by the time the body streams.
+    async with AsyncSessionLocal() as db:
+        usernames: dict[str, str] = {}
+
+        async def username(sender_id: str) -> str:
+            if sender_id not in usernames:
+                usernames[sender_id] = (
+                    await db.scalar(
+                        select(User.display_username).where(
+                            User.user_id == uuid.UUID(sender_id)
+                        )
+                    )
+                    or ""
+                )
+            return usernames[sender_id]
+
+        async def archived(record: dict) -> bytes:
+            return _line(
+                {
+                    **record,
+                    "chat_id": str(chat_id),
+                    "sender_username": await username(record["sender_id"]),
+                    "expires_at": None,
+                }
+            )
+
+        # Archived history and the hot table are merged by key as both stream,
+        # so a row present in both (an interrupted archive run) comes out once.
+        cold = _archived_records(chat_id)
+        pending = await anext(cold, None)
+
+        result = await db.stream(
+            select(Message, User.display_username)
+            .join(User, User.user_id == Message.sender_id)
+            .where(Message.chat_id == chat_id, not_expired())
+            .order_by(Message.created_at, Message.message_id)
+            .execution_options(yield_per=EXPORT_FETCH_SIZE)
+        )
+        async for msg, sender_username in result:
+            key = (msg.created_at, msg.message_id)
+            while pending is not None and record_key(pending) <= key:
+                if record_key(pending) < key:
+                    yield await archived(pending)
+                pending = await anext(cold, None)
+            usernames.setdefault(str(msg.sender_id), sender_username)
+            yield _line(
+                {
+                    "message_id": str(msg.message_id),
+                    "chat_id": str(msg.chat_id),
+                    "sender_id": str(msg.sender_id),
+                    "sender_username": sender_username,
+                    "sender_device_id": str(msg.sender_device_id),
+                    "seq": msg.seq,
+                    "client_msg_id": msg.client_msg_id,
+                    "payload": msg.payload,
+                    "created_at": msg.created_at.isoformat(),
+                    "updated_at": (
+                        msg.updated_at.isoformat() if msg.updated_at else None
+                    ),
+                    "expires_at": (
+                        msg.expires_at.isoformat() if msg.expires_at else None
+                    ),
+                    "status": msg.status.value,
+                }
+            )
+        while pending is not None:
+            yield await archived(pending)
+            pending = await anext(cold, None)
+
+
+async def stream_chat_export(
+    chat_id: uuid.UUID, compress: bool = False
+) -> AsyncIterator[bytes]:
+    """NDJSON of a chat's whole history, oldest first, in bounded-size chunks."""
+    encoder = zlib.compressobj(wbits=31) if compress else None  # gzip framing
+    buffer = bytearray()
+    async for line in _export_lines(chat_id):
+        buffer += line
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield encoder.compress(bytes(buffer)) if encoder else bytes(buffer)
+            buffer.clear()
+    if encoder:
+        yield encoder.compress(bytes(buffer)) + encoder.flush()
+    elif buffer:
+        yield bytes(buffer)
@@ -0,0 +1,460 @@
+"""Bulk import of chats, members and messages from a JSONL or CSV dump.
+
+Every input record carries a ``type`` of ``chat``, ``member`` or ``message``:
+
+    {"type": "chat", "chat": "c1", "chat_type": "group", "created_at": "..."}
+    {"type": "member", "chat": "c1", "user": "alice", "role": "admin"}
+    {"type": "message", "chat": "c1", "user": "alice", "payload": "hi",
+     "created_at": "...", "status": "read"}
+
+CSV dumps use the same names as columns. ``chat`` is the dump's own id for a
+chat and ``user`` an existing display username. Records are loaded in chunks;
+each chunk and its checkpoint commit together, so an interrupted import can
+be re-run with the same ``source`` and resumes after the last full chunk.
+
+From the backend directory:
+    uv run python -m app.services.importer dump.jsonl --source legacy-2024
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import IO
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud.chat import next_message_seq
+from app.db.compression import payload_codec
+from app.db.partitions import ensure_month_partitions, month_start
+from app.db.search import TS_CONFIG
+from app.db.session import AsyncSessionLocal
+from app.models.chat import Chat, ChatMembers, Message
+from app.models.imports import ImportCheckpoint
+from app.models.session import Session
+from app.models.user import User
+from app.schemas.chat import ChatMembersRole, ChatType, MessageStatus
+from app.schemas.user import normalize_username
+
+logger = logging.getLogger(__name__)
+
+# Imported messages are attributed to one inactive session per sender.
+IMPORT_DEVICE = "import"
+
+_MESSAGE_COLUMNS = (
+    "message_id",
+    "chat_id",
+    "sender_id",
+    "sender_device_id",
+    "seq",
+    "client_msg_id",
+    "payload",
+    "created_at",
+    "updated_at",
+    "updated",
+    "status",
+    "changed_at",
+    "expires_at",
+)
+
+
+class DumpError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    source: str
+    line: int = 0
+    chats: int = 0
+    members: int = 0
+    messages: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return self.chats + self.members + self.messages
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[dict | DumpError]:
+    # A line that cannot be parsed is yielded as its error, so it is reported
+    # and skipped like any other bad record instead of ending the import.
+    if fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if not line:
+                yield {}
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield DumpError(f"invalid JSON: {e}")
+                continue
+            if isinstance(record, dict):
+                yield record
+            else:
+                yield DumpError("expected a JSON object")
+    elif fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {k: v for k, v in row.items() if v not in (None, "")}
+    else:
+        raise DumpError(f"Unsupported format {fmt!r}")
+
+
+def _skip(report: ImportReport, line: int, error: Exception) -> None:
+    report.skipped += 1
+    if len(report.errors) < 100:
+        report.errors.append(f"line {line}: {error}")
+
+
+def _time(value: str | None, default: datetime) -> datetime:
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _chat_uuid(source: str, ref: str) -> uuid.UUID:
+    # Stable across re-runs, so a resumed import finds chats from earlier chunks.
+    return uuid.uuid5(uuid.NAMESPACE_URL, f"ghost-chat-import:{source}:{ref}")
+
+
+def _message_uuid(created_at: datetime, source: str, line: int) -> uuid.UUID:
+    # v7 layout keyed on the original send time, so imported history sorts
+    # and partitions like live traffic; the rest is derived from its position.
+    millis = (created_at - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+    rand = uuid.uuid5(uuid.NAMESPACE_URL, f"{source}:{line}").int
+    value = (millis & (2**48 - 1)) << 80 | (rand & ((1 << 80) - 1))
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+class _Resolver:
+    """Display usernames to (user_id, import session id), a batch at a time."""
+
+    def __init__(self) -> None:
+        self.known: dict[str, tuple[uuid.UUID, uuid.UUID] | None] = {}
+
+    async def resolve(self, db: AsyncSession, names: Iterable[str]) -> None:
+        missing = {normalize_username(n) for n in names} - self.known.keys()
+        if not missing:
+            return
+        users = dict(
+            (
+                await db.execute(
+                    select(User.normalized_username, User.user_id).where(
+                        User.normalized_username.in_(missing)
+                    )
+                )
+            ).all()
+        )
+        sessions = dict(
+            (
+                await db.execute(
+                    select(Session.user_id, Session.id).where(
+                        Session.user_id.in_(users.values()),
+                        Session.device_info == IMPORT_DEVICE,
+                    )
+                )
+            ).all()
+        )
+        now = datetime.now(timezone.utc)
+        new_sessions = [
+            {
+                "id": uuid.uuid7(),
+                "user_id": user_id,
+                "created_at": now,
+                "expires_at": now,
+                "is_active": False,
+                "device_info": IMPORT_DEVICE,
+            }
+            for user_id in users.values()
+            if user_id not in sessions
+        ]
+        if new_sessions:
+            await db.execute(insert(Session), new_sessions)
+            sessions.update((s["user_id"], s["id"]) for s in new_sessions)
+        for name in missing:
+            user_id = users.get(name)
+            self.known[name] = (user_id, sessions[user_id]) if user_id else None
+
+    def get(self, name: str) -> tuple[uuid.UUID, uuid.UUID] | None:
+        return self.known.get(normalize_username(name))
+
+
+async def _copy_messages(db: AsyncSession, rows: list[dict]) -> None:
+    conn = await db.connection()
+    if conn.dialect.driver == "asyncpg":
+        driver = (await conn.get_raw_connection()).driver_connection
+        # COPY skips the column types and defaults, so payloads are encoded
+        # here, and it cannot call to_tsvector: rows are staged with their
+        # plain text and moved over with the search vector built from it.
+        await driver.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS import_messages "
+            "(LIKE messages, search_text text) ON COMMIT DELETE ROWS"
+        )
+        records = [
+            (
+                *(
+                    payload_codec.encode(row[c]) if c == "payload" else row[c]
+                    for c in _MESSAGE_COLUMNS
+                ),
+                row["payload"],
+            )
+            for row in rows
+        ]
+        await driver.copy_records_to_table(
+            "import_messages",
+            records=records,
+            columns=(*_MESSAGE_COLUMNS, "search_text"),
+        )
+        columns = ", ".join(_MESSAGE_COLUMNS)
+        await driver.execute(
+            f"INSERT INTO messages ({columns}, search_vector) "
+            f"SELECT {columns}, to_tsvector('{TS_CONFIG}', search_text) "
+            "FROM import_messages"
+        )
+        await driver.execute("TRUNCATE import_messages")
+    else:
+        await db.execute(insert(Message), rows)
+
+
+class Importer:
+    def __init__(self, source: str, chunk_size: int) -> None:
+        self.source = source
+        self.chunk_size = chunk_size
+        self.resolver = _Resolver()
+        # Chats known to exist; their seqs are always allocated from the row.
+        self.chats: set[uuid.UUID] = set()
+
+    async def _load_chats(self, db: AsyncSession, chat_ids: set[uuid.UUID]) -> None:
+        missing = chat_ids - self.chats
+        if missing:
+            result = await db.scalars(
+                select(Chat.chat_id).where(Chat.chat_id.in_(missing))
+            )
+            self.chats.update(result)
+
+    async def _load_chunk(
+        self,
+        db: AsyncSession,
+        chunk: list[tuple[int, dict | DumpError]],
+        report: ImportReport,
+    ) -> None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for line, record in chunk:
+            if isinstance(record, DumpError):
+                _skip(report, line, record)
+        chunk = [(n, r) for n, r in chunk if not isinstance(r, DumpError)]
+        await self.resolver.resolve(db, {r["user"] for _, r in chunk if "user" in r})
+        refs = {_chat_uuid(self.source, r["chat"]) for _, r in chunk if "chat" in r}
+        await self._load_chats(db, refs)
+
+        chats, messages = [], []
+        members: dict[tuple[uuid.UUID, uuid.UUID], dict] = {}
+        for line, record in chunk:
+            kind = record.get("type")
+            try:
+                chat_id = _chat_uuid(self.source, record["chat"])
+                if kind == "chat":
+                    if chat_id in self.chats:
+                        continue
+                    self.chats.add(chat_id)
+                    chats.append(
+                        {
+                            "chat_id": chat_id,
+                            "type": ChatType(record.get("chat_type", "group")),
+                            "created_at": _time(record.get("created_at"), now),
+                            "last_seq": 0,
+                        }
+                    )
+                    continue
+
+                if chat_id not in self.chats:
+                    raise DumpError(f"unknown chat {record['chat']!r}")
+                resolved = self.resolver.get(record["user"])
+                if resolved is None:
+                    raise DumpError(f"unknown user {record['user']!r}")
+                user_id, device_id = resolved
+
+                if kind == "member":
+                    members.setdefault(
+                        (chat_id, user_id),
+                        {
+                            "id": uuid.uuid7(),
+                            "chat_id": chat_id,
+                            "user_id": user_id,
+                            "role": ChatMembersRole(record.get("role", "member")),
+                            "joined_at": _time(record.get("joined_at"), now),
+                            "last_read_seq": 0,
+                        },
+                    )
+                elif kind == "message":
+                    created_at = _time(record.get("created_at"), now)
+                    messages.append(
+                        {
+                            "message_id": _message_uuid(created_at, self.source, line),
+                            "chat_id": chat_id,
+                            "sender_id": user_id,
+                            "sender_device_id": device_id,
+                            "seq": None,  # allocated below
+                            "client_msg_id": None,
+                            "payload": record["payload"],
+                            "created_at": created_at,
+                            "updated_at": None,
+                            "updated": False,
+                            "status": MessageStatus(
+                                record.get("status", "read")
+                            ).value,
+                            "changed_at": now,
+                            "expires_at": None,
+                        }
+                    )
+                else:
+                    raise DumpError(f"unknown record type {kind!r}")
+            except (DumpError, KeyError, ValueError) as e:
+                _skip(report, line, e)
+
+        if chats:
+            await db.execute(insert(Chat), chats)
+        added_members = 0
+        if members:
+            # Memberships already in the database, from an earlier run or
+            # added by hand, are left as they are.
+            dialect = db.get_bind().dialect.name
+            upsert = pg_insert if dialect == "postgresql" else sqlite_insert
+            result = await db.execute(
+                upsert(ChatMembers)
+                .on_conflict_do_nothing(index_elements=["chat_id", "user_id"])
+                .returning(ChatMembers.id),
+                list(members.values()),
+            )
+            added_members = len(result.all())
+        if messages:
+            # Seqs come from the chat row under its lock, as for live sends, so
+            # messages sent while the import runs never share one. Chats are
+            # locked in a fixed order so concurrent imports cannot deadlock.
+            counts = Counter(m["chat_id"] for m in messages)
+            next_seq: dict[uuid.UUID, int] = {}
+            last_seqs: dict[uuid.UUID, int] = {}
+            for chat_id in sorted(counts):
+                last_seq, _ = await next_message_seq(db, chat_id, counts[chat_id])
+                next_seq[chat_id] = last_seq - counts[chat_id] + 1
+                last_seqs[chat_id] = last_seq
+            for message in messages:
+                message["seq"] = next_seq[message["chat_id"]]
+                next_seq[message["chat_id"]] += 1
+
+            conn = await db.connection()
+            await conn.run_sync(
+                ensure_month_partitions,
+                {month_start(m["created_at"]) for m in messages},
+            )
+            await _copy_messages(db, messages)
+
+            # Imported history arrives already read by every member; pointers
+            # only ever move forward.
+            for chat_id, last_seq in last_seqs.items():
+                await db.execute(
+                    update(ChatMembers)
+                    .where(
+                        ChatMembers.chat_id == chat_id,
+                        ChatMembers.last_read_seq < last_seq,
+                    )
+                    .values(last_read_seq=last_seq)
+                    .execution_options(synchronize_session=False)
+                )
+
+        report.chats += len(chats)
+        report.members += added_members
+        report.messages += len(messages)
+
+    async def run(self, records: Iterable[dict | DumpError]) -> ImportReport:
+        report = ImportReport(source=self.source)
+        async with AsyncSessionLocal() as db:
+            checkpoint = await db.get(ImportCheckpoint, self.source)
+            if checkpoint is None:
+                checkpoint = ImportCheckpoint(source=self.source, line=0, rows=0)
+                db.add(checkpoint)
+            start_line = report.line = checkpoint.line
+            if start_line:
+                logger.info("Resuming %s after line %d", self.source, start_line)
+
+            numbered = islice(enumerate(records, start=1), start_line, None)
+            started = time.perf_counter()
+            # Reading and parsing the dump is blocking file work; it happens
+            # in a worker thread so the event loop keeps serving meanwhile.
+            while batch := await asyncio.to_thread(
+                list, islice(numbered, self.chunk_size)
+            ):
+                chunk = [(line, record) for line, record in batch if record]
+                await self._load_chunk(db, chunk, report)
+                report.line = batch[-1][0]
+                checkpoint.line = report.line
+                checkpoint.rows += len(batch)
+                checkpoint.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+                await db.commit()
+
+                report.seconds = time.perf_counter() - started
+                logger.info(
+                    "%s: line %d, %d rows, %d skipped, %.0f rows/s",
+                    self.source,
+                    report.line,
+                    report.rows,
+                    report.skipped,
+                    report.rows_per_second,
+                )
+            report.seconds = time.perf_counter() - started
+        return report
+
+
+async def import_dump(
+    stream: IO[str], fmt: str, source: str, chunk_size: int | None = None
+) -> ImportReport:
+    importer = Importer(source, chunk_size or settings.import_chunk_size)
+    return await importer.run(read_records(stream, fmt))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--source", required=True)
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--chunk-size", type=int, default=settings.import_chunk_size)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+    with open(args.path, encoding="utf-8", newline="") as stream:
+        report = asyncio.run(import_dump(stream, fmt, args.source, args.chunk_size))
+    print(
+        f"{report.rows:,} rows ({report.chats} chats, {report.members} members, "
+        f"{report.messages} messages) in {report.seconds:.1f}s, "
+        f"{report.rows_per_second:,.0f} rows/s; {report.skipped} skipped"
+    )
+    for error in report.errors:
+        print(error)
+
+
+if __name__ == "__main__":
+    main()
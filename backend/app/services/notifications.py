@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Protocol
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.notifications import NotificationJob
+from app.models.settings import UserSettings
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 200
+
+
+@dataclass
+class Digest:
+    user_id: uuid.UUID
+    chat_id: uuid.UUID
+    message_count: int
+    first_seq: int
+    last_seq: int
+    last_sender: str
+    preview: str
+    opened_at: datetime
+
+    @classmethod
+    def from_job(cls, job: NotificationJob) -> "Digest":
+        return cls(
+            user_id=job.user_id,
+            chat_id=job.chat_id,
+            message_count=job.message_count,
+            first_seq=job.first_seq,
+            last_seq=job.last_seq,
+            last_sender=job.last_sender,
+            preview=job.preview,
+            opened_at=job.created_at,
+        )
+
+    def to_json(self) -> dict:
+        data = asdict(self)
+        data["user_id"] = str(self.user_id)
+        data["chat_id"] = str(self.chat_id)
+        data["opened_at"] = self.opened_at.isoformat()
+        return data
+
+
+class NotificationSink(Protocol):
+    async def deliver(self, digests: list[Digest]) -> None: ...
+
+
+class LogSink:
+    async def deliver(self, digests: list[Digest]) -> None:
+        for digest in digests:
+            logger.info(
+                "Notify %s: %d new in chat %s",
+                digest.user_id,
+                digest.message_count,
+                digest.chat_id,
+            )
+
+
+class FileSink:
+    """Appends each digest as a JSON line; meant for local runs and tests."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def _write(self, lines: list[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def deliver(self, digests: list[Digest]) -> None:
+        lines = [json.dumps(d.to_json(), ensure_ascii=False) + "\n" for d in digests]
+        await asyncio.to_thread(self._write, lines)
+
+
+def make_sink(name: str, path: str) -> NotificationSink:
+    if name == "file":
+        return FileSink(path)
+    if name == "log":
+        return LogSink()
+    raise ValueError(f"Unknown notification sink: {name}")
+
+
+async def enqueue_notifications(
+    chat_id: uuid.UUID, message: dict, user_ids: list[uuid.UUID]
+) -> None:
+    """Fold a message into each recipient's pending digest for the chat.
+
+    Recipients who turned notifications off are skipped; users without a
+    settings row get the column default, which is on.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    deliver_after = now + timedelta(seconds=settings.notification_digest_seconds)
+    async with AsyncSessionLocal() as db:
+        muted = set(
+            await db.scalars(
+                select(UserSettings.user_id).where(
+                    UserSettings.user_id.in_(user_ids),
+                    UserSettings.notifications_enabled.is_(False),
+                )
+            )
+        )
+        rows = [
+            {
+                "id": uuid.uuid7(),
+                "user_id": uid,
+                "chat_id": chat_id,
+                "message_count": 1,
+                "first_seq": message["seq"],
+                "last_seq": message["seq"],
+                "last_sender": message["sender_username"][:50],
+                "preview": message["payload"][:PREVIEW_LENGTH],
+                "created_at": now,
+                "deliver_after": deliver_after,
+            }
+            for uid in user_ids
+            if uid not in muted
+        ]
+        if not rows:
+            return
+
+        dialect = db.get_bind().dialect.name
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(NotificationJob).values(rows)
+        new = stmt.excluded
+        # The outbox replays a message after a failure; one already folded in
+        # is not counted twice.
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "chat_id"],
+                set_={
+                    "message_count": NotificationJob.message_count + 1,
+                    "last_seq": new.last_seq,
+                    "last_sender": new.last_sender,
+                    "preview": new.preview,
+                },
+                where=new.last_seq > NotificationJob.last_seq,
+            )
+        )
+        await db.commit()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import uuid
+from bisect import bisect_left, insort
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.user import User
+from app.schemas.user import normalize_username
+
+logger = logging.getLogger(__name__)
+
+
+class UsernameIndex:
+    """Sorted in-memory copy of every normalized username for prefix lookups.
+
+    A prefix query is one bisect plus a walk over at most ``limit`` neighbours,
+    so it stays in the microseconds at millions of users. Writes made through
+    this process update it in place; everything else shows up on the next
+    periodic rebuild, which builds new lists and swaps them in at once.
+    """
+
+    def __init__(self, refresh_interval: float) -> None:
+        self.refresh_interval = refresh_interval
+        self._names: list[str] = []
+        self._users: dict[str, tuple[uuid.UUID, str]] = {}
+        self._by_id: dict[uuid.UUID, str] = {}
+        self.loaded = False
+        self._task: asyncio.Task | None = None
+
+    def prefix(self, query: str, limit: int) -> list[tuple[uuid.UUID, str]]:
+        names = self._names
+        start = bisect_left(names, query)
+        hits = []
+        for name in names[start : start + limit]:
+            if not name.startswith(query):
+                break
+            hits.append(self._users[name])
+        return hits
+
+    def upsert(self, user_id: uuid.UUID, normalized: str, display: str) -> None:
+        if self._by_id.get(user_id, normalized) != normalized:
+            self.remove(user_id)
+        previous = self._users.get(normalized)
+        if previous is not None and previous[0] != user_id:
+            # The name changed hands since the last rebuild.
+            self._by_id.pop(previous[0], None)
+        if normalized not in self._users:
+            insort(self._names, normalized)
+        self._users[normalized] = (user_id, display)
+        self._by_id[user_id] = normalized
+
+    def remove(self, user_id: uuid.UUID) -> None:
+        normalized = self._by_id.pop(user_id, None)
+        if normalized is None:
+            return
+        del self._users[normalized]
+        index = bisect_left(self._names, normalized)
+        if index < len(self._names) and self._names[index] == normalized:
+            del self._names[index]
+
+    async def refresh(self) -> None:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(
+                    User.normalized_username, User.user_id, User.display_username
+                ).execution_options(yield_per=10_000)
+            )
+            users = {name: (uid, display) async for name, uid, display in result}
+        by_id = {uid: name for name, (uid, _) in users.items()}
+        self._names, self._users, self._by_id = sorted(users), users, by_id
+        self.loaded = True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the username index")
+            await asyncio.sleep(self.refresh_interval)
+
+
+user_index = UsernameIndex(refresh_interval=settings.user_index_refresh_interval)
+
+
+async def search_users(
+    db: AsyncSession, query: str, limit: int
+) -> list[tuple[uuid.UUID, str]]:
+    """Prefix matches first, then trigram matches on Postgres to fill the page."""
+    query = normalize_username(query)
+    if user_index.loaded:
+        hits = user_index.prefix(query, limit)
+    else:
+        # Still warming up after a restart.
+        result = await db.execute(
+            select(User.user_id, User.display_username)
+            .where(User.normalized_username.startswith(query, autoescape=True))
+            .order_by(User.normalized_username)
+            .limit(limit)
+        )
+        hits = [tuple(row) for row in result.all()]
+
+    fuzzy = len(query) >= 3 and db.get_bind().dialect.name == "postgresql"
+    if fuzzy and len(hits) < limit:
+        # `%` is pg_trgm's similarity operator and is served by the GIN index.
+        result = await db.execute(
+            select(User.user_id, User.display_username)
+            .where(User.normalized_username.op("%")(query))
+            .order_by(func.similarity(User.normalized_username, query).desc())
+            .limit(limit)
+        )
+        seen = {user_id for user_id, _ in hits}
+        hits += [tuple(row) for row in result.all() if row[0] not in seen]
+    return hits[:limit]
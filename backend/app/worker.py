@@ -0,0 +1,597 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.crud.chat import advance_expired_seq, archive_record, touch_chats
+from app.db.partitions import (
+    add_months,
+    detach_partitions_before,
+    ensure_partitions,
+    month_start,
+)
+from app.db.session import AsyncSessionLocal, engine
+from app.models.chat import Chat, Message
+from app.models.notifications import NotificationJob
+from app.models.outbox import OutboxCursor, OutboxEvent
+from app.services.archive import ArchiveStore, archive
+from app.services.notifications import Digest, NotificationSink, make_sink
+
+logger = logging.getLogger(__name__)
+
+# Tells this process's local outbox cursor apart from other processes'.
+INSTANCE_NAME = settings.instance_name or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MessagePurger:
+    """Deletes expired messages in small batches, one expiry bucket at a time.
+
+    Every batch is a bounded range scan on ix_messages_expires_at committed on
+    its own, so no single statement holds locks on a large slice of messages or
+    leaves a burst of dead tuples behind. Reads already hide expired rows, so
+    falling behind only costs disk space.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        bucket_seconds: float,
+        batch_size: int,
+        max_batches: int,
+    ) -> None:
+        self.interval = interval
+        self.bucket = timedelta(seconds=bucket_seconds)
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._task: asyncio.Task | None = None
+
+    def _bucket_end(self, expires_at: datetime) -> datetime:
+        width = self.bucket.total_seconds()
+        epoch = datetime(1970, 1, 1)
+        start = math.floor((expires_at - epoch).total_seconds() / width) * width
+        return epoch + timedelta(seconds=start) + self.bucket
+
+    async def purge(self) -> int:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        deleted = 0
+        batches = 0
+        async with AsyncSessionLocal() as db:
+            while batches < self.max_batches:
+                oldest = await db.scalar(
+                    select(func.min(Message.expires_at)).where(
+                        Message.expires_at <= now
+                    )
+                )
+                if oldest is None:
+                    break
+                upper = min(self._bucket_end(oldest), now)
+
+                # Drain one bucket [oldest, upper] before moving on to the next.
+                while batches < self.max_batches:
+                    batch = (
+                        select(Message.message_id)
+                        .where(
+                            Message.expires_at >= oldest,
+                            Message.expires_at <= upper,
+                        )
+                        .order_by(Message.expires_at)
+                        .limit(self.batch_size)
+                    )
+                    result = await db.execute(
+                        delete(Message)
+                        .where(Message.message_id.in_(batch))
+                        .returning(Message.chat_id)
+                        .execution_options(synchronize_session=False)
+                    )
+                    chat_ids = result.scalars().all()
+                    # Cached pages of these chats still show the rows.
+                    if chat_ids:
+                        await touch_chats(db, set(chat_ids))
+                        await advance_expired_seq(db, set(chat_ids))
+                    await db.commit()
+                    batches += 1
+                    deleted += len(chat_ids)
+                    if len(chat_ids) < self.batch_size:
+                        break
+                    # Let socket traffic through between batches.
+                    await asyncio.sleep(0)
+        if deleted:
+            logger.info("Purged %d expired messages in %d batches", deleted, batches)
+        return deleted
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.purge()
+            except Exception:
+                logger.exception("Failed to purge expired messages")
+
+
+class PartitionMaintainer:
+    """Keeps monthly messages partitions created ahead of time on Postgres.
+
+    Optionally detaches (and drops) partitions older than the retention window,
+    which removes a whole month of history without deleting a single row.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        months_ahead: int,
+        retention_months: int,
+        drop_detached: bool,
+    ) -> None:
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.drop_detached = drop_detached
+        self._task: asyncio.Task | None = None
+
+    async def run_once(self) -> None:
+        async with engine.begin() as conn:
+            created = await conn.run_sync(ensure_partitions, self.months_ahead)
+            detached = []
+            if self.retention_months:
+                cutoff = add_months(
+                    month_start(datetime.now(timezone.utc)), -self.retention_months
+                )
+                detached = await conn.run_sync(
+                    detach_partitions_before, cutoff, self.drop_detached
+                )
+        if created:
+            logger.info("Created message partitions: %s", ", ".join(created))
+        if detached:
+            logger.info("Detached message partitions: %s", ", ".join(detached))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Failed to maintain message partitions")
+            await asyncio.sleep(self.interval)
+
+
+class MessageArchiver:
+    """Moves messages older than ``after`` out of the database into segments.
+
+    Each run appends at most one segment per chat and then deletes exactly the
+    rows it wrote, so the hot table and its indexes only hold recent history.
+    Messages with an expiry are left for the purger.
+    """
+
+    def __init__(
+        self,
+        store: ArchiveStore,
+        interval: float,
+        after_days: int,
+        segment_messages: int,
+        chats_per_run: int,
+    ) -> None:
+        self.store = store
+        self.interval = interval
+        self.after = timedelta(days=after_days)
+        self.segment_messages = segment_messages
+        self.chats_per_run = chats_per_run
+        self._task: asyncio.Task | None = None
+
+    async def archive_once(self) -> int:
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.after
+        archivable = (Message.created_at < cutoff, Message.expires_at.is_(None))
+        moved = 0
+        async with AsyncSessionLocal() as db:
+            chat_ids = (
+                await db.scalars(
+                    select(Message.chat_id)
+                    .where(*archivable)
+                    .distinct()
+                    .limit(self.chats_per_run)
+                )
+            ).all()
+            for chat_id in chat_ids:
+                # Every process runs an archiver; holding the chat row claims
+                # the chat, and one already claimed elsewhere is left to it.
+                claimed = await db.scalar(
+                    select(Chat.chat_id)
+                    .where(Chat.chat_id == chat_id)
+                    .with_for_update(skip_locked=True)
+                )
+                if claimed is None:
+                    continue
+                messages = (
+                    await db.scalars(
+                        select(Message)
+                        .where(Message.chat_id == chat_id, *archivable)
+                        .order_by(Message.created_at, Message.message_id)
+                        .limit(self.segment_messages)
+                    )
+                ).all()
+                if not messages:
+                    await db.commit()
+                    continue
+                records = [archive_record(msg) for msg in messages]
+                await asyncio.to_thread(self.store.write_segment, chat_id, records)
+                # Rows go only after their segment is durable on disk.
+                await db.execute(
+                    delete(Message)
+                    .where(
+                        Message.chat_id == chat_id,
+                        Message.created_at <= messages[-1].created_at,
+                        Message.message_id.in_([m.message_id for m in messages]),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                moved += len(messages)
+        if moved:
+            logger.info("Archived %d messages from %d chats", moved, len(chat_ids))
+        return moved
+
+    def start(self) -> None:
+        if self._task is None and self.after:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.archive_once()
+            except Exception:
+                logger.exception("Failed to archive old messages")
+
+
+class NotificationDispatcher:
+    """Delivers due notification digests to a sink, a batch at a time.
+
+    Due jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    processes can poll the same table without handing out a digest twice. A
+    batch the sink rejects is retried with backoff, up to ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        sink: NotificationSink,
+        interval: float,
+        batch_size: int,
+        max_attempts: int,
+    ) -> None:
+        self.sink = sink
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._task: asyncio.Task | None = None
+
+    async def dispatch_once(self) -> int:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        async with AsyncSessionLocal() as db:
+            jobs = (
+                await db.scalars(
+                    select(NotificationJob)
+                    .where(NotificationJob.deliver_after <= now)
+                    .order_by(NotificationJob.deliver_after)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not jobs:
+                return 0
+            ids = [job.id for job in jobs]
+            try:
+                await self.sink.deliver([Digest.from_job(job) for job in jobs])
+            except Exception:
+                logger.exception("Failed to deliver %d notification digests", len(jobs))
+                attempts = max(job.attempts for job in jobs) + 1
+                retry_at = now + timedelta(seconds=self.interval * 2**attempts)
+                await db.execute(
+                    update(NotificationJob)
+                    .where(NotificationJob.id.in_(ids))
+                    .values(
+                        attempts=NotificationJob.attempts + 1, deliver_after=retry_at
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(
+                    delete(NotificationJob).where(
+                        NotificationJob.id.in_(ids),
+                        NotificationJob.attempts >= self.max_attempts,
+                    )
+                )
+                await db.commit()
+                return 0
+
+            # A message folded in since the claim (possible where row locks are
+            # not available) changed last_seq; that job stays for the next round.
+            await db.execute(
+                delete(NotificationJob)
+                .where(
+                    tuple_(NotificationJob.id, NotificationJob.last_seq).in_(
+                        [(job.id, job.last_seq) for job in jobs]
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return len(jobs)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Keep draining while batches come back full.
+                while await self.dispatch_once() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Failed to dispatch notifications")
+            await asyncio.sleep(self.interval)
+
+
+# (kind, chat_id, event body)
+OutboxConsumer = Callable[[str, uuid.UUID, dict], Awaitable[None]]
+
+
+class OutboxRelay:
+    """Tails outbox_events in id order and hands every event to each consumer.
+
+    The position is kept in outbox_cursors and only moves past an event once
+    every consumer has handled it, so delivery is at least once: a crash or a
+    failing consumer replays from the last committed position.
+
+    A shared relay runs in one process at a time for the whole deployment,
+    whichever holds its cursor row, and also prunes relayed events. A local
+    relay (``local=True``) is meant to have a name unique to its process: each
+    process tails every event for its own sockets and caches, starting from
+    the newest event when its cursor is first made. Writers call ``wake`` on
+    the local relay after committing, so sockets do not wait for the next poll.
+    """
+
+    # An event that keeps failing is skipped after this many tries rather than
+    # holding up everything behind it.
+    MAX_ATTEMPTS = 5
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        batch_size: int,
+        gap_grace_seconds: float,
+        retention_seconds: float,
+        local: bool = False,
+    ) -> None:
+        self.name = name
+        self.local = local
+        self.interval = interval
+        self.batch_size = batch_size
+        self.gap_grace = timedelta(seconds=gap_grace_seconds)
+        self.retention = timedelta(seconds=retention_seconds)
+        self._consumers: list[OutboxConsumer] = []
+        self._failures: dict[int, int] = {}
+        self._last_id: int | None = None
+        self._wake = asyncio.Event()
+        self._pruned_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, consumer: OutboxConsumer) -> None:
+        self._consumers.append(consumer)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def _deliver(self, event: OutboxEvent) -> bool:
+        body = json.loads(event.payload)
+        for consumer in self._consumers:
+            try:
+                await consumer(event.kind, event.chat_id, body)
+            except Exception:
+                attempts = self._failures.get(event.id, 0) + 1
+                logger.exception(
+                    "Outbox consumer failed on event %d (attempt %d)",
+                    event.id,
+                    attempts,
+                )
+                if attempts < self.MAX_ATTEMPTS:
+                    self._failures[event.id] = attempts
+                    return False
+        self._failures.pop(event.id, None)
+        return True
+
+    async def relay_once(self) -> int:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        async with AsyncSessionLocal() as db:
+            cursor = await db.scalar(
+                select(OutboxCursor)
+                .where(OutboxCursor.name == self.name)
+                .with_for_update(skip_locked=True)
+            )
+            if cursor is None:
+                if await db.get(OutboxCursor, self.name) is not None:
+                    return 0  # another process is relaying
+                last_id = self._last_id or 0
+                if self.local and self._last_id is None:
+                    # A process that was not running has nothing to catch up on.
+                    last_id = await db.scalar(select(func.max(OutboxEvent.id))) or 0
+                cursor = OutboxCursor(name=self.name, last_id=last_id)
+                db.add(cursor)
+                try:
+                    await db.flush()
+                except IntegrityError:
+                    return 0
+
+            events = (
+                await db.scalars(
+                    select(OutboxEvent)
+                    .where(OutboxEvent.id > cursor.last_id)
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                )
+            ).all()
+            handled = 0
+            for event in events:
+                # Ids are handed out before commit, so a lower id can still be
+                # in flight. A recent gap is waited out; an old one is a
+                # rolled-back transaction and is skipped.
+                gap = event.id != cursor.last_id + 1
+                if gap and event.created_at > now - self.gap_grace:
+                    break
+                if not await self._deliver(event):
+                    break
+                cursor.last_id = event.id
+                handled += 1
+
+            if (
+                not self.local
+                and time.monotonic() - self._pruned_at >= self.PRUNE_INTERVAL
+            ):
+                self._pruned_at = time.monotonic()
+                await self._prune(db, cursor, now)
+            await db.commit()
+        # Picks up where it was if its cursor is pruned while idle.
+        self._last_id = cursor.last_id
+        return handled
+
+    async def _prune(self, db, cursor: OutboxCursor, now: datetime) -> None:
+        # Local cursors left idle past retention belong to stopped processes.
+        await db.execute(
+            delete(OutboxCursor).where(
+                OutboxCursor.name != self.name,
+                OutboxCursor.updated_at < now - self.retention,
+            )
+        )
+        behind = await db.scalar(
+            select(func.min(OutboxCursor.last_id)).where(
+                OutboxCursor.name != self.name
+            )
+        )
+        await db.execute(
+            delete(OutboxEvent).where(
+                OutboxEvent.id <= min(cursor.last_id, behind or cursor.last_id),
+                OutboxEvent.created_at < now - self.retention,
+            )
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with asyncio.timeout(self.interval):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.relay_once() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Failed to relay outbox events")
+
+
+message_purger = MessagePurger(
+    interval=settings.message_purge_interval,
+    bucket_seconds=settings.message_purge_bucket_seconds,
+    batch_size=settings.message_purge_batch_size,
+    max_batches=settings.message_purge_max_batches,
+)
+partition_maintainer = PartitionMaintainer(
+    interval=settings.message_partition_check_interval,
+    months_ahead=settings.message_partition_months_ahead,
+    retention_months=settings.message_partition_retention_months,
+    drop_detached=settings.message_partition_drop_detached,
+)
+message_archiver = MessageArchiver(
+    store=archive,
+    interval=settings.archive_interval,
+    after_days=settings.archive_after_days,
+    segment_messages=settings.archive_segment_messages,
+    chats_per_run=settings.archive_chats_per_run,
+)
+notification_dispatcher = NotificationDispatcher(
+    sink=make_sink(settings.notification_sink, settings.notification_file),
+    interval=settings.notification_poll_interval,
+    batch_size=settings.notification_batch_size,
+    max_attempts=settings.notification_max_attempts,
+)
+outbox_relay = OutboxRelay(
+    name="default",
+    interval=settings.outbox_poll_interval,
+    batch_size=settings.outbox_batch_size,
+    gap_grace_seconds=settings.outbox_gap_grace_seconds,
+    retention_seconds=settings.outbox_retention_seconds,
+)
+broadcast_relay = OutboxRelay(
+    name=f"broadcast:{INSTANCE_NAME}"[:64],
+    interval=settings.outbox_poll_interval,
+    batch_size=settings.outbox_batch_size,
+    gap_grace_seconds=settings.outbox_gap_grace_seconds,
+    retention_seconds=settings.outbox_retention_seconds,
+    local=True,
+)
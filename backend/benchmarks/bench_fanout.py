@@ -0,0 +1,121 @@
+"""Broadcast latency vs room size: inline loop vs sharded fan-out workers.
+Use from backend dir:
+uv run python -m benchmarks.bench_fanout --sizes 10 100 1000 5000
+
+Sockets are in-memory fakes with a fixed per-send delay, plus one slow socket
+per room, so the numbers show scheduling and head-of-line blocking rather than
+network cost. "ret" is how long the sender is held, "p50" the median socket's
+delivery time and "last" when the whole room has the frame.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.core.fanout import FanoutPool
+from app.core.ws_settings import ConnectionManager
+from app.schemas.chat import Message, MessageStatus
+
+RUNS = 5
+
+
+class FakeSocket:
+    def __init__(self, delay: float, done: "Counter") -> None:
+        self.delay = delay
+        self.done = done
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def _send(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(0)
+        self.done.hit()
+
+    async def send_text(self, data: str):
+        await self._send()
+
+    async def send_bytes(self, data: bytes):
+        await self._send()
+
+
+class Counter:
+    def __init__(self, target: int) -> None:
+        self.target = target
+        self.times: list[float] = []
+        self.finished = asyncio.Event()
+
+    def hit(self) -> None:
+        self.times.append(time.perf_counter())
+        if len(self.times) >= self.target:
+            self.finished.set()
+
+
+def _message(receivers: int) -> dict:
+    return Message(
+        message_id=str(uuid.uuid4()),
+        chat_id=str(uuid.uuid4()),
+        sender_id=str(uuid.uuid4()),
+        sender_username="alice",
+        sender_device_id=str(uuid.uuid4()),
+        seq=1234,
+        payload="see you at 7, bring the charger",
+        created_at=datetime.now(timezone.utc),
+        status=MessageStatus.sent,
+        receiver_id=[str(uuid.uuid4()) for _ in range(receivers)] or None,
+    ).model_dump(mode="json")
+
+
+async def _run(size: int, pool: FanoutPool | None, slow: float, message: dict):
+    manager = ConnectionManager(fanout=pool, fanout_threshold=1, send_timeout=30)
+    counter = Counter(size)
+    for i in range(size):
+        sock = FakeSocket(slow if i == 0 else 0.0, counter)
+        await manager.connect("room", sock, user_id=uuid.uuid4())
+
+    start = time.perf_counter()
+    await manager.broadcast("room", message)
+    returned = time.perf_counter() - start
+    await counter.finished.wait()
+    delivered = [(t - start) * 1000 for t in counter.times]
+    return returned * 1000, statistics.median(delivered), max(delivered)
+
+
+async def main_async(args) -> None:
+    pool = FanoutPool(workers=args.workers)
+    pool.start()
+    print(
+        f"{'members':>8} {'list':>5} {'inline ret':>10} {'p50':>7} {'last':>7}"
+        f" {'pool ret':>9} {'p50':>7} {'last':>7}  (ms, median of {RUNS})"
+    )
+    for size in args.sizes:
+        # Receiver lists are dropped above the limit, as add_message does.
+        with_list = size <= args.receivers_max
+        message = _message(size if with_list else 0)
+        inline = [await _run(size, None, args.slow, message) for _ in range(RUNS)]
+        pooled = [await _run(size, pool, args.slow, message) for _ in range(RUNS)]
+        columns = [
+            statistics.median(run[i] for run in runs)
+            for runs in (inline, pooled)
+            for i in range(3)
+        ]
+        row = "{:>10.2f} {:>7.2f} {:>7.2f} {:>9.2f} {:>7.2f} {:>7.2f}".format(*columns)
+        print(f"{size:>8} {'yes' if with_list else 'no':>5} {row}")
+    await pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--slow", type=float, default=0.05, help="slow socket delay")
+    parser.add_argument("--receivers-max", type=int, default=100)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Full-text search over a synthetic corpus: FTS5 index vs a LIKE scan.
+Use from backend dir:
+uv run python -m benchmarks.bench_search --rows 2000000
+
+Builds the same FTS5 table and triggers the app creates on SQLite, so the
+insert rate includes keeping the index in sync.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+
+from app.db.search import SQLITE_SEARCH_DDL
+
+BATCH = 10_000
+VOCABULARY = 20_000
+RUNS = 20
+
+
+def _words(rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [
+        "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        for _ in range(VOCABULARY)
+    ]
+
+
+def _payload(rng: random.Random, words: list[str]) -> str:
+    # Zipf-ish: low ranks are common words, high ranks rare ones.
+    n = rng.randint(3, 20)
+    return " ".join(
+        words[min(int(rng.paretovariate(1.1)) - 1, VOCABULARY - 1)] for _ in range(n)
+    )
+
+
+def _timed(conn: sqlite3.Connection, sql: str, *params) -> float:
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = _words(rng)
+    chats = [uuid.uuid4().hex for _ in range(1000)]
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE messages (message_id TEXT, chat_id TEXT, payload TEXT,"
+            " PRIMARY KEY (message_id))"
+        )
+        for statement in SQLITE_SEARCH_DDL:
+            conn.execute(statement)
+
+        start = time.perf_counter()
+        done = 0
+        while done < args.rows:
+            n = min(BATCH, args.rows - done)
+            conn.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?)",
+                (
+                    (uuid.uuid4().hex, rng.choice(chats), _payload(rng, words))
+                    for _ in range(n)
+                ),
+            )
+            conn.commit()
+            done += n
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path) / 2**20
+        print(
+            f"insert with FTS triggers: {args.rows / elapsed:,.0f} rows/s, "
+            f"{size:,.0f} MiB"
+        )
+
+        chat = chats[0]
+        cases = {
+            "common": words[0],
+            "mid": words[50],
+            "rare": words[5000],
+            "two terms": f"{words[1]} {words[200]}",
+        }
+        print(f"{'query':<10} {'fts ms':>8} {'chat fts':>9} {'like ms':>9}")
+        for name, query in cases.items():
+            match = " ".join(f'"{t}"' for t in query.split())
+            fts = _timed(
+                conn,
+                "SELECT message_id, snippet(messages_fts, 0, '<mark>', '</mark>',"
+                " '…', 16) FROM messages_fts WHERE messages_fts MATCH ?"
+                " ORDER BY rank LIMIT 20",
+                match,
+            )
+            chat_fts = _timed(
+                conn,
+                "SELECT message_id FROM messages_fts WHERE messages_fts MATCH ?"
+                " AND chat_id = ? ORDER BY rank LIMIT 20",
+                match,
+                chat,
+            )
+            like = _timed(
+                conn,
+                "SELECT message_id FROM messages WHERE payload LIKE ?"
+                " ORDER BY rowid DESC LIMIT 20",
+                "%" + query.split()[0] + "%",
+            )
+            print(f"{name:<10} {fts:>8.2f} {chat_fts:>9.2f} {like:>9.2f}")
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main()
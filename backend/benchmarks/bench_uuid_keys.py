@@ -0,0 +1,60 @@
+"""Insert throughput and primary-key index size, uuid4 vs uuid7. Use from backend dir:
+uv run python -m benchmarks.bench_uuid_keys --rows 10000000
+
+Each run uses a WITHOUT ROWID SQLite table, so rows live in the primary-key
+B-tree just like a Postgres PK index, and random keys cause the same page splits.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+BATCH = 10_000
+
+
+def _run(name: str, make_id, rows: int) -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE TABLE messages (message_id BLOB PRIMARY KEY, payload TEXT)"
+            " WITHOUT ROWID"
+        )
+        start = time.perf_counter()
+        done = 0
+        while done < rows:
+            n = min(BATCH, rows - done)
+            conn.executemany(
+                "INSERT INTO messages VALUES (?, ?)",
+                ((make_id().bytes, "hello") for _ in range(n)),
+            )
+            conn.commit()
+            done += n
+        elapsed = time.perf_counter() - start
+
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.close()
+        print(
+            f"{name}: {rows / elapsed:>10,.0f} rows/s  "
+            f"{pages * page_size / 2**20:>8.1f} MiB ({pages:,} pages)"
+        )
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    _run("uuid4", uuid.uuid4, args.rows)
+    _run("uuid7", uuid.uuid7, args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare the JSON and msgpack WebSocket codecs. Use from backend dir:
+uv run python -m benchmarks.bench_wire
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.core.wire import JSON, MSGPACK
+from app.schemas.chat import Message, MessageStatus
+
+N = 50_000
+
+
+def _sample_outbound() -> dict:
+    return Message(
+        message_id=str(uuid.uuid4()),
+        chat_id=str(uuid.uuid4()),
+        sender_id=str(uuid.uuid4()),
+        sender_username="alice",
+        sender_device_id=str(uuid.uuid4()),
+        seq=1234,
+        payload="see you at 7, bring the charger",
+        created_at=datetime.now(timezone.utc),
+        status=MessageStatus.sent,
+        receiver_id=[str(uuid.uuid4())],
+        receiver_username=["bob"],
+    ).model_dump(mode="json")
+
+
+def _bench(codec, outbound: dict, inbound: dict) -> None:
+    encoded = codec.encode(outbound)
+    start = time.perf_counter()
+    for _ in range(N):
+        codec.encode(outbound)
+    encode_us = (time.perf_counter() - start) / N * 1e6
+
+    frame = codec.encode(inbound)
+    start = time.perf_counter()
+    for _ in range(N):
+        codec.decode(frame)
+    decode_us = (time.perf_counter() - start) / N * 1e6
+
+    name = codec.subprotocol or "json"
+    print(
+        f"{name:<18} message frame {len(encoded):>4} B  ack frame {len(frame):>3} B  "
+        f"encode {encode_us:6.2f} us  decode+validate {decode_us:6.2f} us"
+    )
+
+
+def main():
+    outbound = _sample_outbound()
+    inbound = {"event": "ack", "payload": {"seq": 1234, "status": "read"}}
+    _bench(JSON, outbound, inbound)
+    if MSGPACK is None:
+        print("msgpack not installed; install the `msgpack` extra to compare")
+        return
+    _bench(MSGPACK, outbound, inbound)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,5 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         reload=True,
+        ws_max_size=settings.ws_max_frame_bytes,
     )
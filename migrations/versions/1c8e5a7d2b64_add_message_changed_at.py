@@ -0,0 +1,36 @@
+"""add message changed_at
+
+Revision ID: 1c8e5a7d2b64
+Revises:
+Create Date: 2026-10-19 07:31:18.902457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "1c8e5a7d2b64"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("changed_at", sa.DateTime(), nullable=True))
+    # Existing rows last changed when they were edited or sent.
+    op.execute(
+        "UPDATE messages SET changed_at = "
+        "coalesce(updated_at, created_at, now() at time zone 'utc')"
+    )
+    op.alter_column("messages", "changed_at", nullable=False)
+    op.create_index("ix_messages_changed_at", "messages", ["changed_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_changed_at", table_name="messages")
+    op.drop_column("messages", "changed_at")
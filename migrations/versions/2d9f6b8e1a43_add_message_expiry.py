@@ -0,0 +1,34 @@
+"""add message expiry
+
+Revision ID: 2d9f6b8e1a43
+Revises: 7e4b1d9a3c52
+Create Date: 2026-10-19 08:51:06.284719
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2d9f6b8e1a43"
+down_revision: Union[str, Sequence[str], None] = "7e4b1d9a3c52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("expires_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_messages_expires_at", "messages", ["expires_at"])
+    op.add_column(
+        "chats", sa.Column("message_ttl_seconds", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("chats", "message_ttl_seconds")
+    op.drop_index("ix_messages_expires_at", table_name="messages")
+    op.drop_column("messages", "expires_at")
@@ -0,0 +1,149 @@
+"""partition messages by month
+
+Revision ID: 3f1c2a9d7b40
+Revises: 2d9f6b8e1a43
+Create Date: 2026-10-19 09:12:44.518203
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9d7b40"
+down_revision: Union[str, Sequence[str], None] = "2d9f6b8e1a43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+FOREIGN_KEYS = (
+    ("chat_id", "chats", "chat_id"),
+    ("sender_id", "users", "user_id"),
+    ("sender_device_id", "sessions", "id"),
+)
+
+INDEXES = (
+    ("ix_messages_chat_id", "chat_id"),
+    ("ix_messages_sender_id", "sender_id"),
+    ("ix_messages_sender_device_id", "sender_device_id"),
+    ("ix_messages_changed_at", "changed_at"),
+    ("ix_messages_expires_at", "expires_at"),
+    ("ix_messages_chat_created", "chat_id, created_at, message_id"),
+)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(bind) -> bool:
+    relkind = bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = 'messages'")
+    ).scalar()
+    return relkind == "p"
+
+
+def _set_aside(bind, table: str) -> None:
+    # Move the old table and its index/constraint names out of the way.
+    op.execute(f"ALTER TABLE messages RENAME TO {table}")
+    indexes = bind.execute(
+        sa.text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        {"table": table},
+    ).scalars().all()
+    for name in indexes:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_old")
+
+
+def _add_foreign_keys() -> None:
+    for column, table, target in FOREIGN_KEYS:
+        op.execute(
+            f"ALTER TABLE messages ADD FOREIGN KEY ({column}) "
+            f"REFERENCES {table} ({target}) ON DELETE CASCADE"
+        )
+
+
+def _add_indexes() -> None:
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON messages ({columns})")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or _is_partitioned(bind):
+        # SQLite keeps the single table; fresh databases are created partitioned.
+        return
+
+    _set_aside(bind, "messages_unpartitioned")
+    op.execute(
+        "UPDATE messages_unpartitioned SET created_at = now() "
+        "WHERE created_at IS NULL"
+    )
+    op.execute(
+        "CREATE TABLE messages (LIKE messages_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE messages ADD PRIMARY KEY (message_id, created_at)")
+    _add_foreign_keys()
+
+    oldest = bind.execute(
+        sa.text("SELECT min(created_at) FROM messages_unpartitioned")
+    ).scalar()
+    now = datetime.now(timezone.utc)
+    month = date((oldest or now).year, (oldest or now).month, 1)
+    last = _add_months(date(now.year, now.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE messages_{month:%Y_%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.execute("INSERT INTO messages SELECT * FROM messages_unpartitioned")
+    op.execute("DROP TABLE messages_unpartitioned")
+
+    _add_indexes()
+    # Unique indexes must include the partition key, so these only refuse a row
+    # inserted twice; uniqueness across created_at rests on the chat row lock
+    # every send takes before it checks and assigns these keys.
+    op.execute(
+        "CREATE UNIQUE INDEX ix_messages_chat_seq_part "
+        "ON messages (chat_id, seq, created_at)"
+    )
+    op.execute(
+        "CREATE UNIQUE INDEX ix_messages_device_client_msg "
+        "ON messages (sender_device_id, client_msg_id, created_at)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not _is_partitioned(bind):
+        return
+
+    _set_aside(bind, "messages_partitioned")
+    op.execute(
+        "CREATE TABLE messages (LIKE messages_partitioned INCLUDING DEFAULTS)"
+    )
+    op.execute("INSERT INTO messages SELECT * FROM messages_partitioned")
+    # Drops every attached partition with it; detached ones are left alone.
+    op.execute("DROP TABLE messages_partitioned")
+
+    op.execute("ALTER TABLE messages ADD PRIMARY KEY (message_id)")
+    _add_foreign_keys()
+    _add_indexes()
+    op.execute(
+        "CREATE UNIQUE INDEX ix_messages_chat_seq ON messages (chat_id, seq)"
+    )
+    op.execute(
+        "ALTER TABLE messages ADD CONSTRAINT uq_message_device_client_msg "
+        "UNIQUE (sender_device_id, client_msg_id)"
+    )
@@ -0,0 +1,31 @@
+"""add chat expired seq
+
+Revision ID: 4c7e1b9d2f60
+Revises: f3b8d2a6c915
+Create Date: 2026-10-19 20:11:09.482716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4c7e1b9d2f60"
+down_revision: Union[str, Sequence[str], None] = "f3b8d2a6c915"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "chats",
+        sa.Column("expired_seq", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("chats", "expired_seq")
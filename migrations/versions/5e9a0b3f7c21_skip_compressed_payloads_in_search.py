@@ -0,0 +1,47 @@
+"""skip compressed payloads in search
+
+Revision ID: 5e9a0b3f7c21
+Revises: c4d7a1e9b052
+Create Date: 2026-10-19 14:22:10.604518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e9a0b3f7c21"
+down_revision: Union[str, Sequence[str], None] = "c4d7a1e9b052"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild_search_vector(source: str) -> None:
+    # A generated column's expression cannot be altered in place.
+    op.execute("DROP INDEX IF EXISTS ix_messages_search")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {source})) STORED"
+    )
+    op.execute(
+        "CREATE INDEX ix_messages_search ON messages USING GIN (search_vector)"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        # SQLite's FTS triggers are created on startup by create_all.
+        return
+    _rebuild_search_vector(
+        "CASE WHEN left(payload, 1) = chr(27) THEN '' ELSE payload END"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _rebuild_search_vector("payload")
@@ -0,0 +1,70 @@
+"""add message sequence numbers
+
+Revision ID: 6a2f9c1e4d87
+Revises: 1c8e5a7d2b64
+Create Date: 2026-10-19 08:04:52.371606
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6a2f9c1e4d87"
+down_revision: Union[str, Sequence[str], None] = "1c8e5a7d2b64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("seq", sa.Integer(), nullable=True))
+    # Number existing history per chat in send order; the message id breaks ties.
+    op.execute(
+        "UPDATE messages SET seq = numbered.seq FROM ("
+        "SELECT message_id, ROW_NUMBER() OVER "
+        "(PARTITION BY chat_id ORDER BY created_at, message_id) AS seq "
+        "FROM messages) AS numbered "
+        "WHERE messages.message_id = numbered.message_id"
+    )
+    op.alter_column("messages", "seq", nullable=False)
+    op.create_index(
+        "ix_messages_chat_seq", "messages", ["chat_id", "seq"], unique=True
+    )
+
+    op.add_column(
+        "chats",
+        sa.Column("last_seq", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        "UPDATE chats SET last_seq = newest.seq FROM ("
+        "SELECT chat_id, max(seq) AS seq FROM messages GROUP BY chat_id) AS newest "
+        "WHERE chats.chat_id = newest.chat_id"
+    )
+
+    op.add_column(
+        "chat_members",
+        sa.Column("last_read_seq", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "chat_members", sa.Column("last_read_at", sa.DateTime(), nullable=True)
+    )
+    # A member has read up to their own newest message or the newest one marked
+    # read, whichever is later; statuses were the only read state before.
+    op.execute(
+        "UPDATE chat_members SET last_read_seq = coalesce(("
+        "SELECT max(m.seq) FROM messages m "
+        "WHERE m.chat_id = chat_members.chat_id "
+        "AND (m.sender_id = chat_members.user_id OR m.status = 'read')), 0)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("chat_members", "last_read_at")
+    op.drop_column("chat_members", "last_read_seq")
+    op.drop_column("chats", "last_seq")
+    op.drop_index("ix_messages_chat_seq", table_name="messages")
+    op.drop_column("messages", "seq")
@@ -0,0 +1,35 @@
+"""index message changes per chat
+
+Revision ID: 7a5d3e9c1b84
+Revises: 4c7e1b9d2f60
+Create Date: 2026-10-19 20:36:52.904137
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7a5d3e9c1b84"
+down_revision: Union[str, Sequence[str], None] = "4c7e1b9d2f60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sync reads changes per chat; a global changed_at index made every sync
+    # walk every chat's changes since the watermark.
+    op.create_index(
+        "ix_messages_chat_changed",
+        "messages",
+        ["chat_id", "changed_at", "message_id"],
+    )
+    op.drop_index("ix_messages_changed_at", table_name="messages")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_messages_changed_at", "messages", ["changed_at"])
+    op.drop_index("ix_messages_chat_changed", table_name="messages")
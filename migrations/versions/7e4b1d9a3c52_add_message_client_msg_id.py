@@ -0,0 +1,36 @@
+"""add message client_msg_id
+
+Revision ID: 7e4b1d9a3c52
+Revises: 6a2f9c1e4d87
+Create Date: 2026-10-19 08:27:40.618395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7e4b1d9a3c52"
+down_revision: Union[str, Sequence[str], None] = "6a2f9c1e4d87"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "messages", sa.Column("client_msg_id", sa.String(length=64), nullable=True)
+    )
+    op.create_unique_constraint(
+        "uq_message_device_client_msg",
+        "messages",
+        ["sender_device_id", "client_msg_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_message_device_client_msg", "messages", type_="unique")
+    op.drop_column("messages", "client_msg_id")
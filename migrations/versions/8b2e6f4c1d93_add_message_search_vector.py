@@ -0,0 +1,40 @@
+"""add message search vector
+
+Revision ID: 8b2e6f4c1d93
+Revises: 3f1c2a9d7b40
+Create Date: 2026-10-19 11:40:07.126455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b2e6f4c1d93"
+down_revision: Union[str, Sequence[str], None] = "3f1c2a9d7b40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        # SQLite's FTS5 table is created on startup by create_all.
+        return
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', payload)) STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_messages_search ON messages "
+        "USING GIN (search_vector)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_messages_search")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,28 @@
+"""add chat title
+
+Revision ID: 9d3b6e2a4f18
+Revises: 5e9a0b3f7c21
+Create Date: 2026-10-19 15:03:51.227914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3b6e2a4f18"
+down_revision: Union[str, Sequence[str], None] = "5e9a0b3f7c21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("chats", sa.Column("title", sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("chats", "title")
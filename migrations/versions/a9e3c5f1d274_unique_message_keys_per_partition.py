@@ -0,0 +1,45 @@
+"""unique message keys per partition
+
+Revision ID: a9e3c5f1d274
+Revises: e2a7c9f4b815
+Create Date: 2026-10-19 18:40:12.745031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a9e3c5f1d274"
+down_revision: Union[str, Sequence[str], None] = "e2a7c9f4b815"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _replace_indexes(unique: str, extra: str) -> None:
+    op.execute("DROP INDEX IF EXISTS ix_messages_chat_seq_part")
+    op.execute(
+        f"CREATE {unique}INDEX ix_messages_chat_seq_part "
+        f"ON messages (chat_id, seq{extra})"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_messages_device_client_msg")
+    op.execute(
+        f"CREATE {unique}INDEX ix_messages_device_client_msg "
+        f"ON messages (sender_device_id, client_msg_id{extra})"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # Databases partitioned before the keys carried created_at have plain ones.
+    _replace_indexes("UNIQUE ", ", created_at")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _replace_indexes("", "")
@@ -0,0 +1,36 @@
+"""add chat changed_at
+
+Revision ID: b6f1d8c3a2e7
+Revises: 9d3b6e2a4f18
+Create Date: 2026-10-19 17:42:08.503116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6f1d8c3a2e7"
+down_revision: Union[str, Sequence[str], None] = "9d3b6e2a4f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "chats",
+        sa.Column(
+            "changed_at",
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.text("(now() at time zone 'utc')"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("chats", "changed_at")
@@ -0,0 +1,36 @@
+"""add username trigram index
+
+Revision ID: c4d7a1e9b052
+Revises: 8b2e6f4c1d93
+Create Date: 2026-10-19 13:05:42.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d7a1e9b052"
+down_revision: Union[str, Sequence[str], None] = "8b2e6f4c1d93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        # Fuzzy matching is Postgres-only; SQLite gets prefix matches only.
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users "
+        "USING GIN (normalized_username gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_users_username_trgm")
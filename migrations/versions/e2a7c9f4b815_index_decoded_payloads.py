@@ -0,0 +1,99 @@
+"""index decoded payloads
+
+Revision ID: e2a7c9f4b815
+Revises: b6f1d8c3a2e7
+Create Date: 2026-10-19 18:05:31.227940
+
+"""
+import base64
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c9f4b815"
+down_revision: Union[str, Sequence[str], None] = "b6f1d8c3a2e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_BATCH = 1000
+
+
+def _decode(stored: str) -> str:
+    # Mirrors app.db.compression.PayloadCodec.decode without importing the app.
+    tag, body = stored[:2], stored[2:]
+    if tag == "\x1br":
+        return body
+    data = base64.b85decode(body)
+    if tag == "\x1bz":
+        return zlib.decompress(data).decode()
+    if tag == "\x1bs":
+        from compression import zstd
+
+        return zstd.decompress(data).decode()
+    raise ValueError(f"Unknown payload codec tag: {tag!r}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        # SQLite's FTS table is rebuilt on startup once its triggers change.
+        return
+    # The generated column could only see the stored, possibly compressed text;
+    # the app now writes the vector itself from the plain payload.
+    op.execute("DROP INDEX IF EXISTS ix_messages_search")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
+    op.execute("ALTER TABLE messages ADD COLUMN search_vector tsvector")
+    op.execute(
+        "UPDATE messages SET search_vector = to_tsvector('simple', payload) "
+        "WHERE left(payload, 1) <> chr(27)"
+    )
+    # Compressed rows are decoded here, a batch at a time in key order.
+    bind = op.get_bind()
+    after = ("-infinity", "00000000-0000-0000-0000-000000000000")
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT created_at, message_id, payload FROM messages "
+                "WHERE left(payload, 1) = chr(27) "
+                "AND (created_at, message_id) > "
+                "(CAST(:c AS timestamp), CAST(:m AS uuid)) "
+                "ORDER BY created_at, message_id LIMIT :n"
+            ),
+            {"c": after[0], "m": after[1], "n": _BATCH},
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            sa.text(
+                "UPDATE messages SET search_vector = to_tsvector('simple', :text) "
+                "WHERE message_id = :message_id AND created_at = :created_at"
+            ),
+            [
+                {"message_id": m, "created_at": c, "text": _decode(p)}
+                for c, m, p in rows
+            ],
+        )
+        after = (rows[-1][0], rows[-1][1])
+    op.execute(
+        "CREATE INDEX ix_messages_search ON messages USING GIN (search_vector)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_messages_search")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', "
+        "CASE WHEN left(payload, 1) = chr(27) THEN '' ELSE payload END)) STORED"
+    )
+    op.execute(
+        "CREATE INDEX ix_messages_search ON messages USING GIN (search_vector)"
+    )
@@ -0,0 +1,35 @@
+"""index message expiry per chat
+
+Revision ID: f3b8d2a6c915
+Revises: a9e3c5f1d274
+Create Date: 2026-10-19 19:02:47.318624
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b8d2a6c915"
+down_revision: Union[str, Sequence[str], None] = "a9e3c5f1d274"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Only messages that expire are indexed; most rows never do.
+    op.create_index(
+        "ix_messages_chat_expires",
+        "messages",
+        ["chat_id", "expires_at"],
+        postgresql_where=sa.text("expires_at IS NOT NULL"),
+        sqlite_where=sa.text("expires_at IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_chat_expires", table_name="messages")